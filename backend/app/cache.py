@@ -0,0 +1,101 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a time-to-live."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value, ttl: float | None = None):
+        # A per-entry ttl can only shorten the cache-wide one.
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+class ExpiringDict:
+    """Entries kept until their own expiry. Unlike TTLCache there is no size cap, so nothing leaves early.
+
+    Setting a key again can only extend its life.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+        self._heap: list[tuple[float, Hashable]] = []
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            # A key set again has a later expiry of its own further down the heap.
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == expires_at:
+                del self._data[key]
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return default
+            return entry[1]
+
+    def set(self, key: Hashable, value, ttl: float | None = None):
+        now = time.monotonic()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._prune(now)
+            previous = self._data.get(key)
+            if previous is not None and previous[0] >= expires_at:
+                self._data[key] = (previous[0], value)
+                return
+            self._data[key] = (expires_at, value)
+            heapq.heappush(self._heap, (expires_at, key))
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+class ExpiringSet(ExpiringDict):
+    def add(self, key: Hashable, ttl: float | None = None):
+        self.set(key, True, ttl)
\ No newline at end of file
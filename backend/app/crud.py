@@ -1,95 +1,347 @@
+import os
 import psycopg
+from typing import Iterator
 from psycopg.rows import dict_row
 import app.schemas as schemas
 
+# Hot queries are sent as named prepared statements on first use. Disable when
+# running behind a transaction-pooling proxy that cannot keep them per session.
+PREPARE = os.getenv("DB_PREPARE_STATEMENTS", "true").lower() == "true"
+
+# Every column except the generated search_vector, which no response includes.
+CHARACTER_COLUMNS = (
+    "id", "user_id", "name", "race", "gender", "backstory",
+    *schemas.STAT_FIELDS,
+    "created_at", "updated_at"
+)
+CHARACTER_SELECT = ", ".join(CHARACTER_COLUMNS)
+
+EXPORT_COLUMNS = (
+    "id", "name", "race", "gender", "backstory",
+    *schemas.STAT_FIELDS,
+    "created_at", "updated_at"
+)
+EXPORT_QUERY = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM characters WHERE user_id = %s ORDER BY created_at, id;"
+
+# Query text shared with crud_async, so the sync and async paths always run the same SQL.
+CREATE_USER_QUERY = """
+INSERT INTO users (username, hashed_password)
+VALUES (%s, %s)
+RETURNING id, username, created_at;
+"""
+
 def create_user(conn, user: schemas.UserCreate, hashed_password: str):
-    query = """
-    INSERT INTO users (username, hashed_password)
-    VALUES (%s, %s)
-    RETURNING id, username, created_at;
-    """
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, (user.username, hashed_password))
+        cur.execute(CREATE_USER_QUERY, (user.username, hashed_password))
         return cur.fetchone()
     
-def create_character(conn, char: schemas.CharacterCreate, user_id: int):
-    query = """
-    INSERT INTO characters (
-        user_id, name, race, gender, backstory,
-        stat_str, stat_dex, stat_con, stat_int, stat_wis, stat_cha
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    RETURNING *;
-    """
-    params = (
+CREATE_CHARACTER_QUERY = f"""
+INSERT INTO characters (
+    user_id, name, race, gender, backstory,
+    stat_str, stat_dex, stat_con, stat_int, stat_wis, stat_cha
+) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+RETURNING {CHARACTER_SELECT};
+"""
+
+def create_character_params(char: schemas.CharacterCreate, user_id: int) -> tuple:
+    return (
         user_id, char.name, char.race.value, char.gender.value, char.backstory,
         char.stat_str, char.stat_dex, char.stat_con, 
         char.stat_int, char.stat_wis, char.stat_cha
     )
+
+def create_character(conn, char: schemas.CharacterCreate, user_id: int):
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, params)
+        cur.execute(CREATE_CHARACTER_QUERY, create_character_params(char, user_id), prepare=PREPARE)
         return cur.fetchone()
 
+CHARACTER_COPY_COLUMNS = (
+    "id", "user_id", "name", "race", "gender", "backstory",
+    *schemas.STAT_FIELDS
+)
+ALLOCATE_CHARACTER_IDS_QUERY = "SELECT nextval(pg_get_serial_sequence('characters', 'id')) FROM generate_series(1, %s);"
+COPY_CHARACTERS_QUERY = f"COPY characters ({', '.join(CHARACTER_COPY_COLUMNS)}) FROM STDIN;"
+
+def character_copy_row(char_id: int, user_id: int, char: schemas.CharacterCreate) -> tuple:
+    return (
+        char_id, user_id, char.name, char.race.value, char.gender.value, char.backstory,
+        char.stat_str, char.stat_dex, char.stat_con,
+        char.stat_int, char.stat_wis, char.stat_cha
+    )
+
+def bulk_create_characters(conn, chars: list[schemas.CharacterCreate], user_id: int) -> list[int]:
+    if not chars:
+        return []
+    with conn.cursor() as cur:
+        # COPY cannot return ids, so reserve them up front and copy them in explicitly.
+        cur.execute(ALLOCATE_CHARACTER_IDS_QUERY, (len(chars),))
+        ids = [row[0] for row in cur.fetchall()]
+        with cur.copy(COPY_CHARACTERS_QUERY) as copy:
+            for char_id, char in zip(ids, chars):
+                copy.write_row(character_copy_row(char_id, user_id, char))
+    return ids
+
+# One statement text for any batch size: every column arrives as an array and is unnested server-side.
+INSERT_CHARACTERS_QUERY = f"""
+INSERT INTO characters ({', '.join(CHARACTER_COPY_COLUMNS)})
+SELECT * FROM unnest(
+    %s::int[], %s::int[], %s::text[], %s::text[], %s::text[], %s::text[],
+    %s::int[], %s::int[], %s::int[], %s::int[], %s::int[], %s::int[]
+)
+RETURNING {CHARACTER_SELECT};
+"""
+
+def insert_characters_params(ids: list[int], items: list[tuple[schemas.CharacterCreate, int]]) -> list[list]:
+    rows = [character_copy_row(char_id, user_id, char) for char_id, (char, user_id) in zip(ids, items)]
+    return [list(column) for column in zip(*rows)]
+
+def create_characters(conn, items: list[tuple[schemas.CharacterCreate, int]]) -> list[dict]:
+    """Inserts (character, user_id) pairs in one statement; rows come back in input order."""
+    if not items:
+        return []
+    with conn.cursor(row_factory=dict_row) as cur:
+        # RETURNING order is unspecified, so ids are reserved up front and used to match rows to inputs.
+        cur.execute(ALLOCATE_CHARACTER_IDS_QUERY, (len(items),))
+        ids = [row["nextval"] for row in cur.fetchall()]
+        cur.execute(INSERT_CHARACTERS_QUERY, insert_characters_params(ids, items), prepare=PREPARE)
+        rows = {row["id"]: row for row in cur.fetchall()}
+    return [rows[char_id] for char_id in ids]
+
+USER_BY_ID_QUERY = "SELECT * FROM users WHERE id = %s;"
+USER_BY_USERNAME_QUERY = "SELECT * FROM users WHERE username = %s;"
+CHARACTER_QUERY = f"SELECT {CHARACTER_SELECT} FROM characters WHERE id = %s;"
+USER_CHARACTER_QUERY = f"SELECT {CHARACTER_SELECT} FROM characters WHERE id = %s AND user_id = %s;"
+
 def get_user_by_id(conn, user_id: int) -> dict:
-    query = "SELECT * FROM users WHERE id = %s;"
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, (user_id,))
+        cur.execute(USER_BY_ID_QUERY, (user_id,))
         return cur.fetchone()
 
 def get_user_by_username(conn, username: str) -> dict:
-    query = "SELECT * FROM users WHERE username = %s;"
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, (username,))
+        cur.execute(USER_BY_USERNAME_QUERY, (username,), prepare=PREPARE)
         return cur.fetchone()
     
 def get_character(conn, char_id: int) -> dict:
-    query = "SELECT * FROM characters WHERE id = %s;"
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, (char_id,))
+        cur.execute(CHARACTER_QUERY, (char_id,))
+        return cur.fetchone()
+
+def get_user_character(conn, char_id: int, user_id: int) -> dict | None:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(USER_CHARACTER_QUERY, (char_id, user_id), prepare=PREPARE)
         return cur.fetchone()
 
-def get_user_characters(conn, user_id: int) -> list[dict]:
-    query = "SELECT * FROM characters WHERE user_id = %s ORDER BY created_at DESC LIMIT 20 OFFSET 0;"
+def build_user_characters_query(user_id: int, filters: schemas.CharacterListQuery, after: tuple | None, limit: int) -> tuple[str, list]:
+    # Column names come from fixed whitelists, only values are passed as parameters.
+    conditions = ["user_id = %s"]
+    params = [user_id]
+    if filters.race is not None:
+        conditions.append("race = %s")
+        params.append(filters.race.value)
+    if filters.gender is not None:
+        conditions.append("gender = %s")
+        params.append(filters.gender.value)
+    for stat in schemas.STAT_FIELDS:
+        low = getattr(filters, f"{stat}_min")
+        high = getattr(filters, f"{stat}_max")
+        if low is not None:
+            conditions.append(f"{stat} >= %s")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{stat} <= %s")
+            params.append(high)
+    if after is not None:
+        # Keyset pagination: continue strictly after the last (created_at, id) seen.
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(after)
+    params.append(limit)
+    query = f"""
+    SELECT {CHARACTER_SELECT} FROM characters
+    WHERE {" AND ".join(conditions)}
+    ORDER BY created_at DESC, id DESC
+    LIMIT %s;
+    """
+    return query, params
+
+def get_user_characters(conn, user_id: int, filters: schemas.CharacterListQuery, after: tuple | None = None, limit: int = 20) -> list[dict]:
+    query, params = build_user_characters_query(user_id, filters, after, limit)
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, (user_id,))
+        cur.execute(query, params)
         return cur.fetchall()
     
+# Full-text matches rank by ts_rank_cd over the generated search_vector (name weighted above backstory).
+# With pg_trgm, names that fuzzily contain the search text also match and add their word similarity.
+SEARCH_FUZZY_QUERY = f"""
+SELECT {CHARACTER_SELECT}, ts_rank_cd(search_vector, query) + word_similarity(%s, name) AS rank
+FROM characters, websearch_to_tsquery('english', %s) AS query
+WHERE user_id = %s AND (search_vector @@ query OR %s <%% name)
+ORDER BY rank DESC, id DESC
+LIMIT %s;
+"""
+SEARCH_QUERY = f"""
+SELECT {CHARACTER_SELECT}, ts_rank_cd(search_vector, query) AS rank
+FROM characters, websearch_to_tsquery('english', %s) AS query
+WHERE user_id = %s AND (search_vector @@ query OR strpos(lower(name), lower(%s)) > 0)
+ORDER BY rank DESC, id DESC
+LIMIT %s;
+"""
+
+def build_search_query(user_id: int, text: str, limit: int, fuzzy: bool) -> tuple[str, tuple]:
+    if fuzzy:
+        return SEARCH_FUZZY_QUERY, (text, text, user_id, text, limit)
+    return SEARCH_QUERY, (text, user_id, text, limit)
+
+def search_user_characters(conn, user_id: int, text: str, limit: int = 20, fuzzy: bool = True) -> list[dict]:
+    query, params = build_search_query(user_id, text, limit, fuzzy)
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(query, params, prepare=PREPARE)
+        return cur.fetchall()
+
+HAS_EXTENSION_QUERY = "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = %s);"
+
+def has_extension(conn, name: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(HAS_EXTENSION_QUERY, (name,))
+        return cur.fetchone()[0]
+
+USER_CHARACTER_NAMES_QUERY = "SELECT name FROM characters WHERE user_id = %s;"
+
+def get_user_character_names(conn, user_id: int) -> list[str]:
+    with conn.cursor() as cur:
+        cur.execute(USER_CHARACTER_NAMES_QUERY, (user_id,), prepare=PREPARE)
+        return [row[0] for row in cur.fetchall()]
+
+TAKEN_NAMES_QUERY = "SELECT DISTINCT name FROM characters WHERE user_id = %s AND name = ANY(%s);"
+
+def get_taken_names(conn, user_id: int, names: list[str]) -> list[str]:
+    with conn.cursor() as cur:
+        cur.execute(TAKEN_NAMES_QUERY, (user_id, names), prepare=PREPARE)
+        return [row[0] for row in cur.fetchall()]
+
+CHARACTER_STATS_QUERY = "SELECT * FROM character_stats WHERE user_id = %s ORDER BY race, gender;"
+
+def get_character_stats(conn, user_id: int) -> list[dict]:
+    # One row per (race, gender) group, however many characters the user owns.
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(CHARACTER_STATS_QUERY, (user_id,), prepare=PREPARE)
+        return cur.fetchall()
+
+def iter_user_character_batches(conn, user_id: int, batch_size: int) -> Iterator[list[tuple]]:
+    # Named cursor: rows stay on the server and are pulled batch_size at a time.
+    with conn.cursor(name="export_characters") as cur:
+        cur.execute(EXPORT_QUERY, (user_id,))
+        while rows := cur.fetchmany(batch_size):
+            yield rows
+
+# Weighted pick: the smallest Exp(1)/weight key wins with probability weight / total weight.
+RANDOM_SEED_QUERY = "SELECT content FROM random_seeds WHERE category = %s ORDER BY -LN(1 - RANDOM()) / weight LIMIT 1;"
+
 def get_random_seed(conn, category: str) -> str | None:
-    query = "SELECT content FROM random_seeds WHERE category = %s ORDER BY RANDOM() LIMIT 1;"
+    query = RANDOM_SEED_QUERY
     with conn.cursor() as cur:
-        cur.execute(query, (category,))
+        cur.execute(query, (category,), prepare=PREPARE)
         result = cur.fetchone()
         return result[0] if result else None
+
+def get_random_seeds(conn, categories: list[str]) -> list[str | None]:
+    # Pipeline mode sends every lookup before reading any result: one round-trip in total.
+    query = RANDOM_SEED_QUERY
+    cursors = []
+    with conn.pipeline():
+        for category in categories:
+            cur = conn.cursor()
+            cur.execute(query, (category,), prepare=PREPARE)
+            cursors.append(cur)
+    results = []
+    for cur in cursors:
+        row = cur.fetchone()
+        results.append(row[0] if row else None)
+        cur.close()
+    return results
+
+# Stable order, so a given table content always yields the same catalog.
+ALL_SEEDS_QUERY = "SELECT category, content, weight FROM random_seeds ORDER BY category, content;"
+
+def get_all_seeds(conn) -> list[tuple[str, str, float]]:
+    with conn.cursor() as cur:
+        cur.execute(ALL_SEEDS_QUERY)
+        return cur.fetchall()
     
-def update_character(conn, char_id: int, user_id: int, updates: schemas.CharacterUpdate) -> dict | None:
+# Updates always use one canonical statement: each column is guarded by a
+# "was it set" flag, so the SQL text (and its server-side plan) never changes.
+UPDATE_COLUMN_TYPES = {
+    "name": "text", "race": "text", "gender": "text", "backstory": "text",
+    **{stat: "int" for stat in schemas.STAT_FIELDS}
+}
+UPDATE_SET_CLAUSE = ", ".join(
+    f"{column} = CASE WHEN %s THEN %s::{column_type} ELSE {column} END"
+    for column, column_type in UPDATE_COLUMN_TYPES.items()
+) + ", updated_at = NOW()"
+UPDATE_CHARACTER_QUERY = f"UPDATE characters SET {UPDATE_SET_CLAUSE} WHERE id = %s AND user_id = %s RETURNING {CHARACTER_SELECT};"
+UPDATE_USER_CHARACTERS_QUERY = f"UPDATE characters SET {UPDATE_SET_CLAUSE} WHERE user_id = %s AND id = ANY(%s) RETURNING {CHARACTER_SELECT};"
+
+def build_update_params(updates: schemas.CharacterUpdate) -> list | None:
     update_data = updates.model_dump(exclude_unset=True)
     if not update_data:
         return None # Nothing to update
-    set_clause = ", ".join([f"{column} = %s" for column in update_data.keys()])
-    set_clause += ", updated_at = NOW()"
-    
-    values = list(update_data.values())
-    values.append(char_id)
-    values.append(user_id)
+    params = []
+    for column in UPDATE_COLUMN_TYPES:
+        params.append(column in update_data)
+        params.append(update_data.get(column))
+    return params
 
-    query = f"""
-    UPDATE characters 
-    SET {set_clause} 
-    WHERE id = %s AND user_id = %s
-    RETURNING *;
-    """
+def update_character(conn, char_id: int, user_id: int, updates: schemas.CharacterUpdate) -> dict | None:
+    params = build_update_params(updates)
+    if params is None:
+        return None
+    params.append(char_id)
+    params.append(user_id)
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, values)
+        cur.execute(UPDATE_CHARACTER_QUERY, params, prepare=PREPARE)
         return cur.fetchone()
 
-def delete_character(conn, char_id: int, user_id: int) -> bool: # Returns True if deleted
-    query = "DELETE FROM characters WHERE id = %s AND user_id = %s RETURNING id;"
+def update_user_characters(conn, char_ids: list[int], user_id: int, updates: schemas.CharacterUpdate) -> list[dict]:
+    params = build_update_params(updates)
+    if params is None:
+        return []
+    params.append(user_id)
+    params.append(char_ids)
     with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, (char_id, user_id))
-        return cur.rowcount > 0
+        cur.execute(UPDATE_USER_CHARACTERS_QUERY, params, prepare=PREPARE)
+        return cur.fetchall()
+
+DELETE_CHARACTER_QUERY = "DELETE FROM characters WHERE id = %s AND user_id = %s RETURNING name;"
+DELETE_USER_CHARACTERS_QUERY = "DELETE FROM characters WHERE user_id = %s AND id = ANY(%s) RETURNING id;"
+SET_USER_DISABLED_QUERY = "UPDATE users SET disabled = %s WHERE id = %s;"
+#Foreign key CASCADE will handle the character cleanup.
+DELETE_USER_QUERY = "DELETE FROM users WHERE id = %s;"
+PING_QUERY = "SELECT 1;"
+
+def delete_character(conn, char_id: int, user_id: int) -> dict | None: # Returns {"name": ...} of the deleted row, None if nothing was deleted
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(DELETE_CHARACTER_QUERY, (char_id, user_id), prepare=PREPARE)
+        return cur.fetchone()
+
+def delete_user_characters(conn, char_ids: list[int], user_id: int) -> list[int]:
+    with conn.cursor() as cur:
+        cur.execute(DELETE_USER_CHARACTERS_QUERY, (user_id, char_ids))
+        return [row[0] for row in cur.fetchall()]
     
+def set_user_disabled(conn, user_id: int, disabled: bool) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(SET_USER_DISABLED_QUERY, (disabled, user_id))
+        return cur.rowcount > 0
+
 def delete_user(conn, user_id: int) -> bool:
-    #Foreign key CASCADE will handle the character cleanup.
-    query = "DELETE FROM users WHERE id = %s;"
     with conn.cursor() as cur:
-        cur.execute(query, (user_id,))
-        return cur.rowcount > 0
\ No newline at end of file
+        cur.execute(DELETE_USER_QUERY, (user_id,))
+        return cur.rowcount > 0
+
+def ping(conn):
+    with conn.cursor() as cur:
+        cur.execute(PING_QUERY)
+
+# Write routes commit before invalidating caches; the dependency teardown would only commit after the response is sent.
+def commit(conn):
+    conn.commit()
\ No newline at end of file
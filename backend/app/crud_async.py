@@ -0,0 +1,211 @@
+import functools
+from typing import AsyncIterator
+import psycopg
+from psycopg.rows import dict_row
+from starlette.concurrency import run_in_threadpool
+import app.crud as crud
+import app.metrics as metrics
+import app.schemas as schemas
+
+def sync_fallback(sync_fn):
+    """Run ``sync_fn`` on the threadpool when handed a connection from the sync pool.
+
+    Calls are timed under the function name either way.
+    """
+    def decorator(async_fn):
+        @functools.wraps(async_fn)
+        async def wrapper(conn, *args, **kwargs):
+            with metrics.timed_query(async_fn.__name__):
+                if isinstance(conn, psycopg.AsyncConnection):
+                    return await async_fn(conn, *args, **kwargs)
+                return await run_in_threadpool(sync_fn, conn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+@sync_fallback(crud.create_user)
+async def create_user(conn, user: schemas.UserCreate, hashed_password: str):
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.CREATE_USER_QUERY, (user.username, hashed_password))
+        return await cur.fetchone()
+
+@sync_fallback(crud.create_character)
+async def create_character(conn, char: schemas.CharacterCreate, user_id: int):
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.CREATE_CHARACTER_QUERY, crud.create_character_params(char, user_id), prepare=crud.PREPARE)
+        return await cur.fetchone()
+
+@sync_fallback(crud.bulk_create_characters)
+async def bulk_create_characters(conn, chars: list[schemas.CharacterCreate], user_id: int) -> list[int]:
+    if not chars:
+        return []
+    async with conn.cursor() as cur:
+        await cur.execute(crud.ALLOCATE_CHARACTER_IDS_QUERY, (len(chars),))
+        ids = [row[0] for row in await cur.fetchall()]
+        async with cur.copy(crud.COPY_CHARACTERS_QUERY) as copy:
+            for char_id, char in zip(ids, chars):
+                await copy.write_row(crud.character_copy_row(char_id, user_id, char))
+    return ids
+
+@sync_fallback(crud.create_characters)
+async def create_characters(conn, items: list[tuple[schemas.CharacterCreate, int]]) -> list[dict]:
+    if not items:
+        return []
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.ALLOCATE_CHARACTER_IDS_QUERY, (len(items),))
+        ids = [row["nextval"] for row in await cur.fetchall()]
+        await cur.execute(crud.INSERT_CHARACTERS_QUERY, crud.insert_characters_params(ids, items), prepare=crud.PREPARE)
+        rows = {row["id"]: row for row in await cur.fetchall()}
+    return [rows[char_id] for char_id in ids]
+
+@sync_fallback(crud.get_user_by_id)
+async def get_user_by_id(conn, user_id: int) -> dict:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.USER_BY_ID_QUERY, (user_id,))
+        return await cur.fetchone()
+
+@sync_fallback(crud.get_user_by_username)
+async def get_user_by_username(conn, username: str) -> dict:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.USER_BY_USERNAME_QUERY, (username,), prepare=crud.PREPARE)
+        return await cur.fetchone()
+
+@sync_fallback(crud.get_character)
+async def get_character(conn, char_id: int) -> dict:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.CHARACTER_QUERY, (char_id,))
+        return await cur.fetchone()
+
+@sync_fallback(crud.get_user_character)
+async def get_user_character(conn, char_id: int, user_id: int) -> dict | None:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.USER_CHARACTER_QUERY, (char_id, user_id), prepare=crud.PREPARE)
+        return await cur.fetchone()
+
+@sync_fallback(crud.get_user_characters)
+async def get_user_characters(conn, user_id: int, filters: schemas.CharacterListQuery, after: tuple | None = None, limit: int = 20) -> list[dict]:
+    query, params = crud.build_user_characters_query(user_id, filters, after, limit)
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(query, params)
+        return await cur.fetchall()
+
+@sync_fallback(crud.search_user_characters)
+async def search_user_characters(conn, user_id: int, text: str, limit: int = 20, fuzzy: bool = True) -> list[dict]:
+    query, params = crud.build_search_query(user_id, text, limit, fuzzy)
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(query, params, prepare=crud.PREPARE)
+        return await cur.fetchall()
+
+@sync_fallback(crud.has_extension)
+async def has_extension(conn, name: str) -> bool:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.HAS_EXTENSION_QUERY, (name,))
+        return (await cur.fetchone())[0]
+
+@sync_fallback(crud.get_user_character_names)
+async def get_user_character_names(conn, user_id: int) -> list[str]:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.USER_CHARACTER_NAMES_QUERY, (user_id,), prepare=crud.PREPARE)
+        return [row[0] for row in await cur.fetchall()]
+
+@sync_fallback(crud.get_taken_names)
+async def get_taken_names(conn, user_id: int, names: list[str]) -> list[str]:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.TAKEN_NAMES_QUERY, (user_id, names), prepare=crud.PREPARE)
+        return [row[0] for row in await cur.fetchall()]
+
+@sync_fallback(crud.get_character_stats)
+async def get_character_stats(conn, user_id: int) -> list[dict]:
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.CHARACTER_STATS_QUERY, (user_id,), prepare=crud.PREPARE)
+        return await cur.fetchall()
+
+async def iter_user_character_batches(conn, user_id: int, batch_size: int) -> AsyncIterator[list[tuple]]:
+    async with conn.cursor(name="export_characters") as cur:
+        await cur.execute(crud.EXPORT_QUERY, (user_id,))
+        while rows := await cur.fetchmany(batch_size):
+            yield rows
+
+@sync_fallback(crud.get_random_seed)
+async def get_random_seed(conn, category: str) -> str | None:
+    query = crud.RANDOM_SEED_QUERY
+    async with conn.cursor() as cur:
+        await cur.execute(query, (category,), prepare=crud.PREPARE)
+        result = await cur.fetchone()
+        return result[0] if result else None
+
+@sync_fallback(crud.get_random_seeds)
+async def get_random_seeds(conn, categories: list[str]) -> list[str | None]:
+    query = crud.RANDOM_SEED_QUERY
+    cursors = []
+    async with conn.pipeline():
+        for category in categories:
+            cur = conn.cursor()
+            await cur.execute(query, (category,), prepare=crud.PREPARE)
+            cursors.append(cur)
+    results = []
+    for cur in cursors:
+        row = await cur.fetchone()
+        results.append(row[0] if row else None)
+        await cur.close()
+    return results
+
+@sync_fallback(crud.get_all_seeds)
+async def get_all_seeds(conn) -> list[tuple[str, str, float]]:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.ALL_SEEDS_QUERY)
+        return await cur.fetchall()
+
+@sync_fallback(crud.update_character)
+async def update_character(conn, char_id: int, user_id: int, updates: schemas.CharacterUpdate) -> dict | None:
+    params = crud.build_update_params(updates)
+    if params is None:
+        return None
+    params.append(char_id)
+    params.append(user_id)
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.UPDATE_CHARACTER_QUERY, params, prepare=crud.PREPARE)
+        return await cur.fetchone()
+
+@sync_fallback(crud.update_user_characters)
+async def update_user_characters(conn, char_ids: list[int], user_id: int, updates: schemas.CharacterUpdate) -> list[dict]:
+    params = crud.build_update_params(updates)
+    if params is None:
+        return []
+    params.append(user_id)
+    params.append(char_ids)
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.UPDATE_USER_CHARACTERS_QUERY, params, prepare=crud.PREPARE)
+        return await cur.fetchall()
+
+@sync_fallback(crud.delete_character)
+async def delete_character(conn, char_id: int, user_id: int) -> dict | None: # Returns {"name": ...} of the deleted row, None if nothing was deleted
+    async with conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(crud.DELETE_CHARACTER_QUERY, (char_id, user_id), prepare=crud.PREPARE)
+        return await cur.fetchone()
+
+@sync_fallback(crud.delete_user_characters)
+async def delete_user_characters(conn, char_ids: list[int], user_id: int) -> list[int]:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.DELETE_USER_CHARACTERS_QUERY, (user_id, char_ids))
+        return [row[0] for row in await cur.fetchall()]
+
+@sync_fallback(crud.set_user_disabled)
+async def set_user_disabled(conn, user_id: int, disabled: bool) -> bool:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.SET_USER_DISABLED_QUERY, (disabled, user_id))
+        return cur.rowcount > 0
+
+@sync_fallback(crud.delete_user)
+async def delete_user(conn, user_id: int) -> bool:
+    async with conn.cursor() as cur:
+        await cur.execute(crud.DELETE_USER_QUERY, (user_id,))
+        return cur.rowcount > 0
+
+@sync_fallback(crud.ping)
+async def ping(conn):
+    async with conn.cursor() as cur:
+        await cur.execute(crud.PING_QUERY)
+
+@sync_fallback(crud.commit)
+async def commit(conn):
+    await conn.commit()
\ No newline at end of file
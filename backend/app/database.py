@@ -1,17 +1,102 @@
+import asyncio
 import os
+import time
 import psycopg
-from psycopg_pool import ConnectionPool
-from contextlib import contextmanager
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+from contextlib import contextmanager, asynccontextmanager
+import app.metrics as metrics
+import app.crud as crud
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# When enabled, request handlers borrow from the AsyncConnectionPool instead of the sync pool.
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
 
-pool = ConnectionPool(conninfo=DATABASE_URL, min_size=1, max_size=10)
+# Without prepared statements, also turn off psycopg's automatic preparation of repeated queries.
+CONNECTION_KWARGS = {} if crud.PREPARE else {"prepare_threshold": None}
+
+# Pool sizes are per process; under gunicorn the database sees WEB_CONCURRENCY times DB_POOL_MAX_SIZE connections.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "600"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+# max_idle and max_lifetime already retire old connections. Opt in to also test each connection before
+# lending it out (one extra round trip per checkout) when connections are often killed under the pool.
+DB_POOL_CHECK = os.getenv("DB_POOL_CHECK", "false").lower() == "true"
+
+POOL_KWARGS = {
+    "min_size": DB_POOL_MIN_SIZE,
+    "max_size": DB_POOL_MAX_SIZE,
+    "timeout": DB_POOL_TIMEOUT,
+    "max_idle": DB_POOL_MAX_IDLE,
+    "max_lifetime": DB_POOL_MAX_LIFETIME,
+    "kwargs": CONNECTION_KWARGS,
+    # Nothing connects at import time, so a forked worker never inherits a parent's connections.
+    "open": False,
+}
+
+pool = ConnectionPool(
+    conninfo=DATABASE_URL, check=ConnectionPool.check_connection if DB_POOL_CHECK else None, **POOL_KWARGS
+)
+async_pool = AsyncConnectionPool(
+    conninfo=DATABASE_URL, check=AsyncConnectionPool.check_connection if DB_POOL_CHECK else None, **POOL_KWARGS
+)
+metrics.pool_collector.add("sync", pool)
+metrics.pool_collector.add("async", async_pool)
+
+async def open_pools():
+    """Opens the pool this process serves requests from; called by the app lifespan."""
+    # wait=True makes a worker fail at startup, not on its first request, when the database is unreachable.
+    if DB_ASYNC:
+        await async_pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
+    else:
+        await asyncio.to_thread(pool.open, wait=True, timeout=DB_POOL_TIMEOUT)
+
+async def close_pools():
+    if DB_ASYNC:
+        await async_pool.close()
+    else:
+        await asyncio.to_thread(pool.close)
 
 def get_db():
+    start = time.perf_counter()
     with pool.connection() as conn:
+        metrics.POOL_WAIT.labels("sync").observe(time.perf_counter() - start)
+        yield conn
+
+async def get_async_db():
+    start = time.perf_counter()
+    async with async_pool.connection() as conn:
+        metrics.POOL_WAIT.labels("async").observe(time.perf_counter() - start)
         yield conn
 
+# Dependency used by the routers; yields a sync or async connection depending on DB_ASYNC.
+get_connection = get_async_db if DB_ASYNC else get_db
+
 @contextmanager
 def get_db_context():
     with pool.connection() as conn:
-        yield conn
\ No newline at end of file
+        yield conn
+
+@asynccontextmanager
+async def get_async_db_context():
+    async with async_pool.connection() as conn:
+        yield conn
+
+@asynccontextmanager
+async def borrow_connection():
+    """A connection for async code that is not tied to a request's get_connection dependency."""
+    if DB_ASYNC:
+        async with async_pool.connection() as conn:
+            yield conn
+        return
+    # Waiting on the sync pool happens off the event loop.
+    conn = await asyncio.to_thread(pool.getconn)
+    try:
+        yield conn
+        await asyncio.to_thread(conn.commit)
+    except BaseException:
+        await asyncio.to_thread(conn.rollback)
+        raise
+    finally:
+        await asyncio.to_thread(pool.putconn, conn)
\ No newline at end of file
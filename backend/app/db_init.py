@@ -1,4 +1,5 @@
 import time
+import json
 import psycopg
 import os
 
@@ -6,6 +7,7 @@ import app.security as security
 import app.schemas as schemas
 import app.crud as crud
 import app.database as database
+import app.seed_packs as seed_packs
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -23,6 +25,53 @@ def connect_with_retry(url, retries=10, delay=3):
             print(f"Database not ready ({e}). Retrying in {delay}s... ({i+1}/{retries})")
             time.sleep(delay)
 
+# character_stats keeps, per (user_id, race, gender), the count plus the sum and sum of squares of
+# every stat. Statement-level triggers fold each write's transition table into it, so every path
+# (single saves, COPY imports, bulk updates, the users ON DELETE CASCADE) keeps it exact.
+STAT_SUM_COLUMNS = [f"sum_{stat}" for stat in schemas.STAT_FIELDS]
+STAT_SUMSQ_COLUMNS = [f"sumsq_{stat}" for stat in schemas.STAT_FIELDS]
+
+def character_stats_merge_sql(changes: str) -> str:
+    """Folds `changes` (rows of characters plus a +1/-1 sign column) into character_stats."""
+    deltas = ", ".join(
+        f"COALESCE(SUM(sign * {stat}), 0), COALESCE(SUM(sign * {stat} * {stat}), 0)" for stat in schemas.STAT_FIELDS
+    )
+    columns = ", ".join(f"{total}, {squares}" for total, squares in zip(STAT_SUM_COLUMNS, STAT_SUMSQ_COLUMNS))
+    merges = ", ".join(f"{column} = s.{column} + EXCLUDED.{column}" for column in STAT_SUM_COLUMNS + STAT_SUMSQ_COLUMNS)
+    # Groups whose delta is all zero (e.g. a rename) are skipped. Squares count too: 10 and 14
+    # both set to 12 leave the sum alone but not the sum of squares.
+    changed = " OR ".join(
+        ["SUM(sign) <> 0"]
+        + [f"COALESCE(SUM(sign * {stat}), 0) <> 0 OR COALESCE(SUM(sign * {stat} * {stat}), 0) <> 0" for stat in schemas.STAT_FIELDS]
+    )
+    return f"""
+        INSERT INTO character_stats AS s (user_id, race, gender, count, {columns})
+        SELECT user_id, race, gender, SUM(sign), {deltas}
+        FROM ({changes}) AS changes
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id, race, gender
+        HAVING {changed}
+        ON CONFLICT (user_id, race, gender) DO UPDATE SET count = s.count + EXCLUDED.count, {merges};
+        DELETE FROM character_stats WHERE count = 0 AND user_id IN (SELECT user_id FROM ({changes}) AS changes);
+    """
+
+def character_stats_trigger_sql(operation: str, changes: str, referencing: str) -> list[str]:
+    name = f"character_stats_{operation.lower()}"
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            {character_stats_merge_sql(changes)}
+            RETURN NULL;
+        END;
+        $$;
+        """,
+        f"""
+        CREATE OR REPLACE TRIGGER {name} AFTER {operation} ON characters
+        REFERENCING {referencing} FOR EACH STATEMENT EXECUTE FUNCTION {name}();
+        """,
+    ]
+
 def initialize_all_tables():
     commands = [
         # 1. Users Table
@@ -54,18 +103,69 @@ def initialize_all_tables():
             updated_at TIMESTAMPTZ DEFAULT NOW()
         );
         """,
-        "CREATE INDEX IF NOT EXISTS idx_char_user_id ON characters(user_id);",
+        # Keyset pagination indexes; they supersede the old user_id-only index.
+        "DROP INDEX IF EXISTS idx_char_user_id;",
+        "CREATE INDEX IF NOT EXISTS idx_char_user_created ON characters(user_id, created_at DESC, id DESC);",
+        "CREATE INDEX IF NOT EXISTS idx_char_user_race_gender_created ON characters(user_id, race, gender, created_at DESC, id DESC);",
+        # Ownership-scoped lookups (WHERE id = ... AND user_id = ...) resolve from the index alone.
+        "CREATE INDEX IF NOT EXISTS idx_char_id_user ON characters(id, user_id);",
+        # Full-text search over name (weight A) and backstory (weight B).
+        """
+        ALTER TABLE characters ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(backstory, '')), 'B')
+        ) STORED;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_char_search ON characters USING GIN (search_vector);",
         # 3. Random Seeds Table
         """
         CREATE TABLE IF NOT EXISTS random_seeds (
             id SERIAL PRIMARY KEY,
             category VARCHAR(50) NOT NULL, -- e.g., 'name_male_human', 'surname_elf'
             content TEXT NOT NULL,          -- the actual name or backstory fragment
+            weight REAL NOT NULL DEFAULT 1 CHECK (weight > 0), -- relative rarity within the category
             UNIQUE(category, content)
         );
         """,
+        # Tables created before weights existed.
+        "ALTER TABLE random_seeds ADD COLUMN IF NOT EXISTS weight REAL NOT NULL DEFAULT 1 CHECK (weight > 0);",
         """
         CREATE INDEX IF NOT EXISTS idx_seed_category ON random_seeds(category);
+        """,
+        # 4. Seed Packs Table (content hash of every pack merged into random_seeds)
+        """
+        CREATE TABLE IF NOT EXISTS seed_packs (
+            name TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            loaded_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """,
+        # 5. Character Stats Summary (maintained by the triggers below)
+        f"""
+        CREATE TABLE IF NOT EXISTS character_stats (
+            user_id INTEGER NOT NULL,
+            race TEXT,
+            gender TEXT,
+            count BIGINT NOT NULL DEFAULT 0,
+            {", ".join(f"{column} BIGINT NOT NULL DEFAULT 0" for column in STAT_SUM_COLUMNS + STAT_SUMSQ_COLUMNS)},
+            UNIQUE NULLS NOT DISTINCT (user_id, race, gender)
+        );
+        """,
+        *character_stats_trigger_sql("INSERT", "SELECT 1 AS sign, * FROM new_rows", "NEW TABLE AS new_rows"),
+        *character_stats_trigger_sql("DELETE", "SELECT -1 AS sign, * FROM old_rows", "OLD TABLE AS old_rows"),
+        *character_stats_trigger_sql(
+            "UPDATE",
+            "SELECT 1 AS sign, * FROM new_rows UNION ALL SELECT -1 AS sign, * FROM old_rows",
+            "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        ),
+        # Backfill for characters written before the triggers existed. It also resyncs existing rows,
+        # which repairs sums of squares left stale by older trigger versions.
+        f"""
+        INSERT INTO character_stats (user_id, race, gender, count, {", ".join(f"{total}, {squares}" for total, squares in zip(STAT_SUM_COLUMNS, STAT_SUMSQ_COLUMNS))})
+        SELECT user_id, race, gender, COUNT(*), {", ".join(f"COALESCE(SUM({stat}), 0), COALESCE(SUM({stat} * {stat}), 0)" for stat in schemas.STAT_FIELDS)}
+        FROM characters WHERE user_id IS NOT NULL
+        GROUP BY user_id, race, gender
+        ON CONFLICT (user_id, race, gender) DO UPDATE SET count = EXCLUDED.count, {", ".join(f"{column} = EXCLUDED.{column}" for column in STAT_SUM_COLUMNS + STAT_SUMSQ_COLUMNS)};
         """
     ]
 
@@ -76,7 +176,19 @@ def initialize_all_tables():
                     cur.execute(cmd)
             print("Database schema initialized successfully.")
     except Exception as e:
+        # Re-raised so the migration exits non-zero and deploys gated on it stop here.
         print(f"Error during table initialization: {e}")
+        raise
+    # Fuzzy name search needs pg_trgm from Postgres contrib. It runs separately so a server
+    # without contrib still gets the rest of the schema; search then falls back to substring matching.
+    try:
+        with connect_with_retry(DATABASE_URL) as conn:
+            with conn.cursor() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_char_name_trgm ON characters USING GIN (name gin_trgm_ops);")
+            print("Trigram name index initialized successfully.")
+    except Exception as e:
+        print(f"pg_trgm unavailable, fuzzy name search disabled: {e}")
 
 RANDOM_SEED_DATA =  {
     'human_male': ["Alaric", "Beron", "Cedric", "Donovan", "Eamon", "Finnian", "Garrick", "Hugo", "Ives", "Joram"],
@@ -139,20 +251,21 @@ RANDOM_SEED_DATA =  {
     }
 
 def seed_random_data():
-    insert_command = """
-    INSERT INTO random_seeds (category, content)
-    VALUES (%s, %s)
-    ON CONFLICT (category, content) DO NOTHING;
-    """
+    # The built-in data goes through the same hashed pack loader as external packs.
+    raw = json.dumps(RANDOM_SEED_DATA, sort_keys=True).encode()
     try:
         with connect_with_retry(DATABASE_URL) as conn:
-            with conn.cursor() as cur:
-                for category, contents in RANDOM_SEED_DATA.items():
-                    for content in contents:
-                        cur.execute(insert_command, (category, content))
-            print("Random seed data inserted successfully.")
+            digest = seed_packs.content_hash(raw)
+            if seed_packs.pack_is_current(conn, "builtin", digest):
+                print("Built-in random seed data unchanged, skipping.")
+            else:
+                seed_packs.load_seed_pack(conn, "builtin", seed_packs.parse_seed_pack(raw, ".json"), digest)
+                print("Random seed data inserted successfully.")
+            loaded = seed_packs.load_seed_pack_dir(conn)
+            print(f"Seed packs loaded: {', '.join(loaded) if loaded else 'none changed'}.")
     except Exception as e:
         print(f"Error during seeding random data: {e}")
+        raise
 
 def seed_sample_users():
     sample_users = [
@@ -163,17 +276,23 @@ def seed_sample_users():
     try:
         with database.get_db_context() as conn:
             for username, password in sample_users:
+                # Skipped when present, so re-running the migration succeeds.
+                if crud.get_user_by_username(conn, username):
+                    continue
                 hashed_password = security.get_password_hash(password)
                 user_in = schemas.UserCreate(username=username, password=hashed_password)
                 crud.create_user(conn, user_in, hashed_password)
         print("Sample users inserted successfully.")
     except Exception as e:
         print(f"Error during seeding sample users: {e}")
+        raise
 
 def seed_sample_characters():
     pass
 
 if __name__ == "__main__":
+    # One-shot migration step: run once per deploy, before any app worker starts.
     initialize_all_tables()
-    seed_random_data()
-    seed_sample_users()
\ No newline at end of file
+    with database.pool:
+        seed_random_data()
+        seed_sample_users()
\ No newline at end of file
@@ -1,13 +1,72 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+import app.crud_async as crud_async
+import app.database as database
+import app.metrics as metrics
+import app.security as security
+import service.backstory_engine as backstory_engine
+import service.character_reservoir as character_reservoir
+import service.character_write_queue as character_write_queue
+import service.seed_catalog as seed_catalog
 from app.routers import auth as auth_router
 from app.routers import character as character_router
 from app.routers import user as user_router
 
+async def warm_caches():
+    # Load the seed catalog and compile backstories now, so the first request doesn't pay for it.
+    try:
+        if database.DB_ASYNC:
+            async with database.get_async_db_context() as conn:
+                catalog = await seed_catalog.get_catalog_async(conn)
+        else:
+            with database.get_db_context() as conn:
+                catalog = seed_catalog.get_catalog(conn)
+        backstory_engine.get_engine(catalog)
+    except Exception as e:
+        print(f"Cache warm-up failed, caches will load on first use: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.open_pools()
+    await warm_caches()
+    refill_task = None
+    if character_reservoir.RESERVOIR_ENABLED:
+        refill_task = asyncio.create_task(character_reservoir.reservoir.run())
+    write_task = None
+    if character_write_queue.WRITE_COALESCING_ENABLED:
+        write_task = asyncio.create_task(character_write_queue.character_write_queue.run())
+    yield
+    if refill_task is not None:
+        refill_task.cancel()
+    if write_task is not None:
+        # Not cancelled: a batch mid-flush is already out of pending, and its callers wait on that flush.
+        character_write_queue.character_write_queue.close()
+        await write_task
+        # Saves already accepted are still written before the pool closes.
+        await character_write_queue.character_write_queue.drain()
+    await database.close_pools()
+    security.password_hash_executor.shutdown(wait=False)
+
 app = FastAPI(
     title="Random Character Generator API",
     description="An API for D&D-style character management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so /character/{char_id} stays a single series.
+    route = request.scope.get("route")
+    metrics.REQUEST_LATENCY.labels(
+        request.method, route.path if route else "unmatched", response.status_code
+    ).observe(time.perf_counter() - start)
+    return response
+
 app.include_router(auth_router.router)
 app.include_router(user_router.router)
 app.include_router(character_router.router)
@@ -17,4 +76,13 @@ def root():
     return {
         "message": "Welcome to Character Management API",
         "docs": "/docs"
-    }
\ No newline at end of file
+    }
+
+@app.get("/health", include_in_schema=False)
+async def health(db = Depends(database.get_connection)):
+    await crud_async.ping(db)
+    return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render_latest(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pool connection",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Latency of crud functions",
+    ["function"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+QUERY_ERRORS = Counter(
+    "db_query_errors_total",
+    "crud functions that raised",
+    ["function"],
+)
+GENERATION_STAGE = Histogram(
+    "generation_stage_duration_seconds",
+    "Time spent in each character generation stage",
+    ["stage"],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01, 0.1, 1),
+)
+PASSWORD_HASH_PENDING = Gauge(
+    "password_hash_pending",
+    "Password hash or verify calls queued or running",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hash or verify calls refused because the queue was full",
+)
+RESERVOIR_REQUESTS = Counter(
+    "reservoir_requests_total",
+    "Generate requests served from the character reservoir",
+    ["result"],
+)
+RESERVOIR_DEPTH = Gauge(
+    "reservoir_depth",
+    "Ready characters waiting in the reservoir",
+    ["race", "gender"],
+    multiprocess_mode="livesum",
+)
+WRITE_BATCH_SIZE = Histogram(
+    "character_write_batch_size",
+    "Saves committed together by the write-coalescing queue",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+# Extra observers for generation stages, e.g. to forward spans to a tracer.
+trace_hooks: list[Callable[[str, float], None]] = []
+
+def add_trace_hook(hook: Callable[[str, float], None]):
+    trace_hooks.append(hook)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        GENERATION_STAGE.labels(name).observe(elapsed)
+        for hook in trace_hooks:
+            hook(name, elapsed)
+
+@contextmanager
+def timed_query(function: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        QUERY_ERRORS.labels(function).inc()
+        raise
+    finally:
+        QUERY_LATENCY.labels(function).observe(time.perf_counter() - start)
+
+class PoolCollector:
+    """Exports psycopg_pool statistics at scrape time."""
+
+    def __init__(self):
+        self.pools = {}
+
+    def add(self, name: str, pool):
+        self.pools[name] = pool
+
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Connections currently managed by the pool", labels=["pool"])
+        available = GaugeMetricFamily("db_pool_available", "Idle connections in the pool", labels=["pool"])
+        in_use = GaugeMetricFamily("db_pool_in_use", "Connections currently lent out", labels=["pool"])
+        waiting = GaugeMetricFamily("db_pool_requests_waiting", "Clients waiting for a connection", labels=["pool"])
+        requests = CounterMetricFamily("db_pool_requests", "Connection requests served by the pool", labels=["pool"])
+        errors = CounterMetricFamily("db_pool_request_errors", "Connection requests that failed or timed out", labels=["pool"])
+        for name, pool in self.pools.items():
+            # Only the pool for the configured DB_ASYNC mode is ever opened.
+            if pool.closed:
+                continue
+            stats = pool.get_stats()
+            size.add_metric([name], stats.get("pool_size", 0))
+            available.add_metric([name], stats.get("pool_available", 0))
+            in_use.add_metric([name], stats.get("pool_size", 0) - stats.get("pool_available", 0))
+            waiting.add_metric([name], stats.get("requests_waiting", 0))
+            requests.add_metric([name], stats.get("requests_num", 0))
+            errors.add_metric([name], stats.get("requests_errors", 0))
+        return [size, available, in_use, waiting, requests, errors]
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+# Set under gunicorn so /metrics aggregates every worker rather than whichever one answered the scrape.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+def render_latest() -> bytes:
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    # Pool statistics live in each worker's memory, so these still describe only the answering worker.
+    registry.register(pool_collector)
+    return generate_latest(registry)
\ No newline at end of file
@@ -0,0 +1,110 @@
+import hashlib
+import itertools
+import os
+from typing import Callable, Protocol
+
+from fastapi import Response
+
+from app.cache import TTLCache, ExpiringDict
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "none")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+class CacheBackend(Protocol):
+    def get(self, key: str): ...
+    def set(self, key: str, value, ttl: int): ...
+    def incr(self, key: str) -> int: ...
+
+class NullBackend:
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value, ttl: int):
+        pass
+
+    def incr(self, key: str) -> int:
+        return 0
+
+class MemoryBackend:
+    """Per-process LRU. Other workers only see invalidations once their entries expire."""
+
+    def __init__(self):
+        self.entries = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        # Kept outside the LRU: evicting a counter would resurrect stale entries. Counters may expire,
+        # but every bump takes a fresh number from one process-wide sequence, so a generation is never
+        # reused and entries cached under an expired counter can never match again.
+        self.counters = ExpiringDict(ttl=RESPONSE_CACHE_TTL)
+        self.generations = itertools.count(1)
+
+    def get(self, key: str):
+        counter = self.counters.get(key)
+        if counter is not None:
+            return counter
+        return self.entries.get(key)
+
+    def set(self, key: str, value, ttl: int):
+        self.entries.set(key, value, ttl=ttl)
+
+    def incr(self, key: str) -> int:
+        counter = next(self.generations)
+        self.counters.set(key, counter)
+        return counter
+
+BACKENDS: dict[str, Callable[[], CacheBackend]] = {
+    "none": NullBackend,
+    "memory": MemoryBackend,
+}
+
+def register_backend(name: str, factory: Callable[[], CacheBackend]):
+    BACKENDS[name] = factory
+
+class ResponseCache:
+    """Caches serialized responses per user; any write by the user bumps a generation and orphans them."""
+
+    def __init__(self, backend: CacheBackend, ttl: int = RESPONSE_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+
+    def key(self, user_id: int, key: str) -> str:
+        """Pins the user's current generation. Take it before reading the database and pass it to both
+        get and set: a write that commits mid-read then orphans the entry instead of being masked by it."""
+        generation = self.backend.get(f"generation:{user_id}") or 0
+        return f"response:{user_id}:{generation}:{key}"
+
+    def get(self, cache_key: str) -> tuple[str, bytes, dict] | None:
+        return self.backend.get(cache_key)
+
+    def set(self, cache_key: str, entry: tuple[str, bytes, dict]):
+        self.backend.set(cache_key, entry, self.ttl)
+
+    def invalidate_user(self, user_id: int):
+        self.backend.incr(f"generation:{user_id}")
+
+response_cache = ResponseCache(BACKENDS[RESPONSE_CACHE_BACKEND]())
+
+def character_etag(row: dict) -> str:
+    return f'"{row["id"]}-{int(row["updated_at"].timestamp() * 1_000_000)}"'
+
+def list_etag(rows: list[dict], next_cursor: str | None) -> str:
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(character_etag(row).encode())
+    digest.update((next_cursor or "").encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def conditional_response(if_none_match: str | None, entry: tuple[str, bytes, dict]) -> Response:
+    etag, body, headers = entry
+    headers = {**headers, "ETag": etag}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
\ No newline at end of file
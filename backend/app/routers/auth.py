@@ -3,7 +3,6 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status, APIRouter
 from fastapi.security import OAuth2PasswordRequestForm
 import app.schemas as schemas
-import app.crud as crud
 import app.database as database
 import app.security as security
 
@@ -13,11 +12,11 @@ router = APIRouter(
 )
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db = Depends(database.get_db)
+    db = Depends(database.get_connection)
 ):
-    user = security.authenticate_user(db, form_data.username, form_data.password)
+    user = await security.authenticate_user(db, form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -26,9 +25,10 @@ def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=30)
+    access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # uid lets character routes authorize without looking the user up.
     access_token = security.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     return schemas.Token(access_token=access_token, token_type="bearer")
 
@@ -1,11 +1,27 @@
 import os
+import base64
+import binascii
+import json
+import psycopg
+from datetime import datetime
 from typing import Annotated
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Request, Response
+from pydantic import ValidationError
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import app.schemas as schemas
-import app.crud as crud
+import app.crud_async as crud_async
 import app.database as database
 import app.security as security
-from service.character_generator import generate_character
+from app.response_cache import response_cache, body_etag, character_etag, list_etag, conditional_response
+from app.serialization import RawJSONResponse, CHARACTER_IN_DB_FIELDS, CHARACTER_SEARCH_FIELDS, dump_row, dump_rows, dump_models
+from service.character_generator import generate_character, generate_characters, new_generation_seed, MAX_GENERATION_SEED, NameSpaceExhausted
+from service.name_registry import name_registry, UNIQUE_NAMES_CONFIRM
+import service.seed_catalog as seed_catalog
+import service.character_export as character_export
+import service.character_stats as character_stats
+import service.character_reservoir as character_reservoir
+import service.character_write_queue as character_write_queue
 
 
 router = APIRouter(
@@ -13,68 +29,353 @@ router = APIRouter(
     tags=["character"],  
 )
 
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", "100000"))
+# Attempts at a unique generation before giving up on concurrent saves from other workers.
+UNIQUE_NAME_CHECKS = 3
+
+async def no_connection():
+    return None
+
+# Coalesced saves are written on the queue's own connection, so the request must not hold one while it waits.
+save_connection = no_connection if character_write_queue.WRITE_COALESCING_ENABLED else database.get_connection
+
+# Whether pg_trgm is installed; checked once per process on the first search.
+trigram_available: bool | None = None
+
+async def fuzzy_search_enabled(db) -> bool:
+    global trigram_available
+    if trigram_available is None:
+        trigram_available = await crud_async.has_extension(db, "pg_trgm")
+    return trigram_available
+
+async def current_catalog() -> seed_catalog.SeedCatalog:
+    # A connection is borrowed only when the catalog needs loading, so most generations never touch the pool.
+    if seed_catalog.catalog.is_stale():
+        async with database.borrow_connection() as db:
+            return await seed_catalog.get_catalog_async(db)
+    return seed_catalog.catalog
+
+async def generate_unique(user_id: int, generate) -> list[schemas.CharacterCreate]:
+    """Runs generate(taken) against the user's owned names.
+
+    A warm registry answers without touching the database. An exhausted name space is confirmed by
+    reloading the registry, and with UNIQUE_NAMES_CONFIRM the chosen names are also checked against
+    the database; on a collision the registry is reloaded and generation runs again.
+    """
+    taken = name_registry.cached(user_id)
+    if taken is not None and not UNIQUE_NAMES_CONFIRM:
+        try:
+            return await generate(taken)
+        except NameSpaceExhausted:
+            # The cached set may be stale; reload it below before giving up.
+            taken = None
+    async with database.borrow_connection() as db:
+        fresh = False
+        for attempt in range(UNIQUE_NAME_CHECKS):
+            if taken is None or attempt:
+                taken = await name_registry.reload(db, user_id)
+                fresh = True
+            try:
+                characters = await generate(taken)
+            except NameSpaceExhausted as e:
+                if fresh:
+                    raise HTTPException(status_code=409, detail=str(e))
+                continue
+            if not UNIQUE_NAMES_CONFIRM or not await crud_async.get_taken_names(db, user_id, [char.name for char in characters]):
+                return characters
+    raise HTTPException(status_code=409, detail="Names kept colliding with concurrent saves, please retry")
+
+def deleted_user_exception(user_id: int) -> HTTPException:
+    # The user was deleted through another worker, so this one never saw the revocation; remember it now.
+    security.revoked_users.add(user_id)
+    return security.credentials_exception()
+
+def encode_cursor(row: dict) -> str:
+    raw = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, char_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(char_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.post("/generate", response_model=schemas.CharacterCreate)
-def character_generate(
+async def character_generate(
     request: schemas.CharacterGenerateRequest,
-    current_user: schemas.UserinDB = Depends(security.get_current_user),
-    db=Depends(database.get_db)
+    response: Response,
+    principal: schemas.TokenData = Depends(security.get_current_principal),
+    seed: Annotated[int | None, Query(ge=0, lt=MAX_GENERATION_SEED)] = None
 ):
-    character = generate_character(request, db)
+    entry = None
+    # The reservoir only holds characters rolled with the default stat method.
+    if (
+        seed is None
+        and not request.unique
+        and character_reservoir.RESERVOIR_ENABLED
+        and request.stat_method == schemas.Stat_Method.FOUR_D6_DROP_LOWEST
+    ):
+        entry = character_reservoir.reservoir.pop(request.race, request.gender)
+    if entry is not None:
+        seed, catalog_version, character = entry
+    else:
+        if seed is None:
+            seed = new_generation_seed()
+        catalog = await current_catalog()
+        if request.unique:
+            async def generate(taken):
+                return [generate_character(request, catalog, seed, taken)]
+            character, = await generate_unique(principal.user_id, generate)
+        else:
+            character = generate_character(request, catalog, seed)
+        catalog_version = catalog.version
+    # Replaying the same seed against the same catalog version reproduces this character.
+    response.headers["X-Generation-Seed"] = str(seed)
+    response.headers["X-Seed-Catalog-Version"] = catalog_version
     return character
 
+@router.post("/generate/batch", response_model=list[schemas.CharacterCreate])
+async def character_generate_batch(
+    request: schemas.CharacterBatchGenerateRequest,
+    principal: schemas.TokenData = Depends(security.get_current_principal)
+):
+    catalog = await current_catalog()
+    async def generate(taken):
+        return await run_in_threadpool(generate_characters, request, catalog, taken)
+    if request.unique:
+        characters = await generate_unique(principal.user_id, generate)
+    else:
+        characters = await generate(())
+    body = await run_in_threadpool(dump_models, characters)
+    return RawJSONResponse(body)
+
+def parse_bulk_rows(body: bytes, content_type: str) -> list:
+    # A malformed NDJSON line only fails its own row, so its decode error takes that row's place.
+    if content_type.startswith("application/x-ndjson"):
+        rows = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                rows.append(e)
+        return rows
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed payload: {e}")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of characters")
+    return payload
+
+def parse_bulk_payload(body: bytes, content_type: str) -> tuple[int, list[schemas.CharacterCreate], list[int], list[schemas.CharacterBulkError]]:
+    """Decodes and validates an import; CPU-bound, so the route runs it on the threadpool."""
+    rows = parse_bulk_rows(body, content_type)
+    if len(rows) > BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_IMPORT_MAX_ROWS} characters per import")
+
+    valid, positions, errors = [], [], []
+    for index, item in enumerate(rows):
+        if isinstance(item, json.JSONDecodeError):
+            errors.append(schemas.CharacterBulkError(
+                index=index, errors=[{"type": "json_invalid", "loc": [], "msg": f"Invalid JSON: {item}"}]
+            ))
+            continue
+        try:
+            valid.append(schemas.CharacterCreate.model_validate(item))
+            positions.append(index)
+        except ValidationError as e:
+            errors.append(schemas.CharacterBulkError(index=index, errors=e.errors(include_url=False, include_context=False)))
+    return len(rows), valid, positions, errors
+
+@router.post("/bulk", response_model=schemas.CharacterBulkResult)
+async def bulk_import_characters(
+    request: Request,
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)]
+):
+    count, valid, positions, errors = await run_in_threadpool(
+        parse_bulk_payload, await request.body(), request.headers.get("content-type", "")
+    )
+
+    # Borrowed only for the COPY, so a large import does not hold a pooled connection while it parses.
+    async with database.borrow_connection() as db:
+        try:
+            inserted = await crud_async.bulk_create_characters(db, valid, principal.user_id)
+        except psycopg.errors.ForeignKeyViolation:
+            raise deleted_user_exception(principal.user_id)
+        await crud_async.commit(db)
+    response_cache.invalidate_user(principal.user_id)
+    name_registry.add(principal.user_id, *(char.name for char in valid))
+    ids = [None] * count
+    for index, char_id in zip(positions, inserted):
+        ids[index] = char_id
+    return schemas.CharacterBulkResult(ids=ids, errors=errors)
+
 @router.post("/", response_model=schemas.CharacterinDB)
-def save_character(
+async def save_character(
     character_in: schemas.CharacterCreate,
-    current_user: Annotated[schemas.UserinDB, Depends(security.get_current_user)],
-    db = Depends(database.get_db)
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(save_connection)
 ):
-    new_character = crud.create_character(db, character_in, current_user.id)
-    return new_character
+    try:
+        if character_write_queue.WRITE_COALESCING_ENABLED:
+            new_character = await character_write_queue.character_write_queue.submit(character_in, principal.user_id)
+        else:
+            new_character = await crud_async.create_character(db, character_in, principal.user_id)
+            await crud_async.commit(db)
+    except psycopg.errors.ForeignKeyViolation:
+        raise deleted_user_exception(principal.user_id)
+    response_cache.invalidate_user(principal.user_id)
+    name_registry.add(principal.user_id, new_character["name"])
+    return RawJSONResponse(dump_row(new_character))
 
 @router.get("/", response_model=list[schemas.CharacterCreate])
-def list_my_characters(
-    current_user: Annotated[schemas.UserinDB, Depends(security.get_current_user)],
-    db = Depends(database.get_db)
+async def list_my_characters(
+    filters: Annotated[schemas.CharacterListQuery, Query()],
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection),
+    if_none_match: Annotated[str | None, Header()] = None
+):
+    cache_key = response_cache.key(principal.user_id, f"list:{filters.model_dump_json()}")
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        after = decode_cursor(filters.cursor) if filters.cursor else None
+        # Fetch one extra row to learn whether another page follows.
+        characters = await crud_async.get_user_characters(db, principal.user_id, filters, after, filters.limit + 1)
+        headers = {}
+        if len(characters) > filters.limit:
+            characters = characters[:filters.limit]
+            headers["X-Next-Cursor"] = encode_cursor(characters[-1])
+        body = dump_rows(characters)
+        entry = (list_etag(characters, headers.get("X-Next-Cursor")), body, headers)
+        response_cache.set(cache_key, entry)
+    return conditional_response(if_none_match, entry)
+
+@router.get("/search", response_model=list[schemas.CharacterSearchResult])
+async def search_my_characters(
+    query: Annotated[schemas.CharacterSearchQuery, Query()],
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection),
+    if_none_match: Annotated[str | None, Header()] = None
+):
+    cache_key = response_cache.key(principal.user_id, f"search:{query.model_dump_json()}")
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        fuzzy = await fuzzy_search_enabled(db)
+        characters = await crud_async.search_user_characters(db, principal.user_id, query.q, query.limit, fuzzy)
+        entry = (list_etag(characters, None), dump_rows(characters, CHARACTER_SEARCH_FIELDS), {})
+        response_cache.set(cache_key, entry)
+    return conditional_response(if_none_match, entry)
+
+@router.get("/stats", response_model=schemas.CharacterStats)
+async def my_character_stats(
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection),
+    if_none_match: Annotated[str | None, Header()] = None
 ):
-    characters = crud.get_user_characters(db, current_user.id)
-    return characters
+    cache_key = response_cache.key(principal.user_id, "stats")
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        rows = await crud_async.get_character_stats(db, principal.user_id)
+        body = character_stats.build_character_stats(rows).model_dump_json().encode()
+        entry = (body_etag(body), body, {})
+        response_cache.set(cache_key, entry)
+    return conditional_response(if_none_match, entry)
+
+@router.get("/export")
+async def export_my_characters(
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    format: schemas.ExportFormat = schemas.ExportFormat.NDJSON
+):
+    if database.DB_ASYNC:
+        content = character_export.export_characters_async(principal.user_id, format)
+    else:
+        content = character_export.export_characters(principal.user_id, format)
+    return StreamingResponse(
+        content,
+        media_type=character_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="characters.{format.value}"'}
+    )
+
+@router.post("/bulk/delete", response_model=schemas.CharacterBulkDeleteResult)
+async def bulk_delete_characters(
+    request: schemas.CharacterIdList,
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection)
+):
+    deleted = await crud_async.delete_user_characters(db, request.ids, principal.user_id)
+    await crud_async.commit(db)
+    response_cache.invalidate_user(principal.user_id)
+    name_registry.invalidate(principal.user_id)
+    deleted_ids = set(deleted)
+    missing = [char_id for char_id in dict.fromkeys(request.ids) if char_id not in deleted_ids]
+    return schemas.CharacterBulkDeleteResult(deleted=deleted, missing=missing)
+
+@router.patch("/bulk", response_model=list[schemas.CharacterinDB])
+async def bulk_update_characters(
+    request: schemas.CharacterBulkUpdate,
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection)
+):
+    updated = await crud_async.update_user_characters(db, request.ids, principal.user_id, request.updates)
+    await crud_async.commit(db)
+    response_cache.invalidate_user(principal.user_id)
+    # The old names are not returned, so a rename drops the cached set instead of patching it.
+    if "name" in request.updates.model_fields_set:
+        name_registry.invalidate(principal.user_id)
+    return RawJSONResponse(dump_rows(updated, CHARACTER_IN_DB_FIELDS))
 
 @router.get("/{char_id}", response_model=schemas.CharacterinDB)
-def get_character(
+async def get_character(
     char_id: int,
-    current_user: Annotated[schemas.UserinDB, Depends(security.get_current_user)],
-    db = Depends(database.get_db)
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection),
+    if_none_match: Annotated[str | None, Header()] = None
 ):
-    character = crud.get_character(db, char_id)
-    if character is None or character["user_id"] != current_user.id:
-        raise HTTPException(status_code=404, detail="Character not found")
-    return character
+    cache_key = response_cache.key(principal.user_id, f"character:{char_id}")
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        character = await crud_async.get_user_character(db, char_id, principal.user_id)
+        if character is None:
+            raise HTTPException(status_code=404, detail="Character not found")
+        body = dump_row(character)
+        entry = (character_etag(character), body, {})
+        response_cache.set(cache_key, entry)
+    return conditional_response(if_none_match, entry)
 
 @router.delete("/{char_id}", status_code = status.HTTP_204_NO_CONTENT)
-def delete_character(
+async def delete_character(
     char_id: int,
-    current_user: Annotated[schemas.UserinDB, Depends(security.get_current_user)],
-    db = Depends(database.get_db)
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection)
 ):
-    character = crud.get_character(db, char_id)
-    if character is None or character["user_id"] != current_user.id:
+    deleted = await crud_async.delete_character(db, char_id, principal.user_id)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Character not found")
-    crud.delete_character(db, char_id, current_user.id)
+    await crud_async.commit(db)
+    response_cache.invalidate_user(principal.user_id)
+    name_registry.discard(principal.user_id, deleted["name"])
     return
 
 @router.patch("/{char_id}", response_model=schemas.CharacterinDB)
-def update_character_endpoint(
+async def update_character_endpoint(
     char_id: int,
     updates: schemas.CharacterUpdate,
-    current_user: Annotated[schemas.UserinDB, Depends(security.get_current_user)],
-    db = Depends(database.get_db)
+    principal: Annotated[schemas.TokenData, Depends(security.get_current_principal)],
+    db = Depends(database.get_connection)
 ):
-    updated_char = crud.update_character(db, char_id, current_user.id, updates)
+    updated_char = await crud_async.update_character(db, char_id, principal.user_id, updates)
+    await crud_async.commit(db)
+    response_cache.invalidate_user(principal.user_id)
+    if updated_char is not None and "name" in updates.model_fields_set:
+        name_registry.invalidate(principal.user_id)
     if updated_char is None:
         raise HTTPException(
             status_code=404, 
             detail="Character not found or you do not have permission to edit it"
         )
-    return updated_char
+    return RawJSONResponse(dump_row(updated_char))
 
 
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 import app.schemas as schemas
-import app.crud as crud
+import app.crud_async as crud_async
 import app.database as database
 import app.security as security
+from app.response_cache import response_cache
+from service.name_registry import name_registry
 
 router = APIRouter(
     prefix="/user",
@@ -10,16 +12,16 @@ router = APIRouter(
 )
 
 @router.post("/register", response_model=schemas.UserRead)
-def register_user(user: schemas.UserCreate, db = Depends(database.get_db)):
-    db_user = crud.get_user_by_username(db, user.username)
+async def register_user(user: schemas.UserCreate, db = Depends(database.get_connection)):
+    db_user = await crud_async.get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = security.get_password_hash(user.password)
-    created_user = crud.create_user(db, user, hashed_password)
+    hashed_password = await security.get_password_hash_async(user.password)
+    created_user = await crud_async.create_user(db, user, hashed_password)
     return schemas.UserRead(**created_user)
 
 @router.get("/me", response_model=schemas.UserRead)
-def read_current_user(current_user: schemas.UserRead = Depends(security.get_current_user)):
+async def read_current_user(current_user: schemas.UserRead = Depends(security.get_current_user)):
     current_user_data = schemas.UserRead(
         id=current_user.id,
         username=current_user.username,
@@ -28,6 +30,10 @@ def read_current_user(current_user: schemas.UserRead = Depends(security.get_curr
     return current_user_data
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
-def delete_current_user(db = Depends(database.get_db), current_user: schemas.UserinDB = Depends(security.get_current_user)):
-    crud.delete_user(db, current_user.id)
+async def delete_current_user(db = Depends(database.get_connection), current_user: schemas.UserinDB = Depends(security.get_current_user)):
+    await crud_async.delete_user(db, current_user.id)
+    await crud_async.commit(db)
+    security.invalidate_user(current_user)
+    response_cache.invalidate_user(current_user.id)
+    name_registry.invalidate(current_user.id)
     return None
\ No newline at end of file
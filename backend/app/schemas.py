@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 from enum import Enum
@@ -11,6 +11,8 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    expires_at: Optional[float] = None
 
 # --- USER SCHEMAS ---
 class UserCreate(BaseModel):
@@ -27,6 +29,8 @@ class UserinDB(UserRead):
 
 
 # --- CHARACTER SCHEMAS ---
+STAT_FIELDS = ("stat_str", "stat_dex", "stat_con", "stat_int", "stat_wis", "stat_cha")
+
 class Character_Race(str, Enum): 
     HUMAN = "human"
     ELF = "elf"
@@ -37,9 +41,21 @@ class Character_Gender(str, Enum):
     FEMALE = "female"
     NONBINARY = "nonbinary"
 
+class Stat_Method(str, Enum):
+    FOUR_D6_DROP_LOWEST = "4d6_drop_lowest"
+    THREE_D6 = "3d6"
+    POINT_BUY = "point_buy"
+    STANDARD_ARRAY = "standard_array"
+
 class CharacterGenerateRequest(BaseModel):
     race: Character_Race
     gender: Character_Gender
+    stat_method: Stat_Method = Stat_Method.FOUR_D6_DROP_LOWEST
+    # Avoid names the requesting user already owns.
+    unique: bool = False
+
+class CharacterBatchGenerateRequest(CharacterGenerateRequest):
+    count: int = Field(default=1, ge=1, le=10000)
 
 class CharacterCreate(BaseModel):
     name: str
@@ -59,6 +75,59 @@ class CharacterinDB(CharacterCreate):
     name: str
     created_at: datetime
 
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class CharacterListQuery(BaseModel):
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None
+    race: Optional[Character_Race] = None
+    gender: Optional[Character_Gender] = None
+    stat_str_min: Optional[int] = None
+    stat_str_max: Optional[int] = None
+    stat_dex_min: Optional[int] = None
+    stat_dex_max: Optional[int] = None
+    stat_con_min: Optional[int] = None
+    stat_con_max: Optional[int] = None
+    stat_int_min: Optional[int] = None
+    stat_int_max: Optional[int] = None
+    stat_wis_min: Optional[int] = None
+    stat_wis_max: Optional[int] = None
+    stat_cha_min: Optional[int] = None
+    stat_cha_max: Optional[int] = None
+
+class CharacterSearchQuery(BaseModel):
+    q: str = Field(min_length=1, max_length=200)
+    limit: int = Field(default=20, ge=1, le=100)
+
+class CharacterSearchResult(CharacterinDB):
+    rank: float
+
+class StatSummary(BaseModel):
+    sum: int
+    sum_squares: int
+    mean: float
+    stddev: float
+
+class CharacterStatsGroup(BaseModel):
+    race: Optional[Character_Race]
+    gender: Optional[Character_Gender]
+    count: int
+    stats: dict[str, StatSummary]
+
+class CharacterStats(BaseModel):
+    count: int
+    groups: list[CharacterStatsGroup]
+
+class CharacterBulkError(BaseModel):
+    index: int
+    errors: list[dict]
+
+class CharacterBulkResult(BaseModel):
+    ids: list[Optional[int]]
+    errors: list[CharacterBulkError]
+
 class CharacterUpdate(BaseModel):
     name: Optional[str] = None
     race: Optional[Character_Race] = None
@@ -69,4 +138,14 @@ class CharacterUpdate(BaseModel):
     stat_con: Optional[int] = None
     stat_int: Optional[int] = None
     stat_wis: Optional[int] = None
-    stat_cha: Optional[int] = None
\ No newline at end of file
+    stat_cha: Optional[int] = None
+
+class CharacterIdList(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=10000)
+
+class CharacterBulkUpdate(CharacterIdList):
+    updates: CharacterUpdate
+
+class CharacterBulkDeleteResult(BaseModel):
+    deleted: list[int]
+    missing: list[int]
\ No newline at end of file
@@ -1,21 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
+import asyncio
+import hashlib
 import os
 
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
 
 import app.database as database
-import app.crud as crud
+import app.crud_async as crud_async
 import app.schemas as schemas
+import app.metrics as metrics
+from app.cache import TTLCache, ExpiringSet
 
 
 SECRET_KEY =  os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("HASHING_ALGORITHM")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
-password_hash = PasswordHash.recommended()
+password_hash = PasswordHash((
+    Argon2Hasher(
+        time_cost=int(os.getenv("ARGON2_TIME_COST", "3")),
+        memory_cost=int(os.getenv("ARGON2_MEMORY_COST", "65536")),
+        parallelism=int(os.getenv("ARGON2_PARALLELISM", "4")),
+    ),
+))
+
+# Argon2 runs on its own small pool so login bursts cannot starve the request threadpool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+password_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_hash_pending = 0
+
+# Authenticated users keyed by username, so repeat requests skip the users lookup.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Verified claims keyed by token digest; entries never outlive the token itself.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# Deleted or disabled user ids, remembered for as long as a token issued to them can live. Never
+# size-capped: evicting a revocation early would make its tokens valid again.
+revoked_users = ExpiringSet(ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 def verify_password(plain_password, hashed_password):
     return password_hash.verify(plain_password, hashed_password)
@@ -23,15 +54,38 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return password_hash.hash(password)
 
-def get_user(username: str, conn) -> schemas.UserinDB | None:
-    user = crud.get_user_by_username(conn, username=username)
+async def run_password_hash(fn, *args):
+    global password_hash_pending
+    if password_hash_pending >= PASSWORD_HASH_MAX_PENDING:
+        metrics.PASSWORD_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    password_hash_pending += 1
+    metrics.PASSWORD_HASH_PENDING.set(password_hash_pending)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_hash_executor, fn, *args)
+    finally:
+        password_hash_pending -= 1
+        metrics.PASSWORD_HASH_PENDING.set(password_hash_pending)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_password_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_password_hash(get_password_hash, password)
+
+async def get_user(username: str, conn) -> schemas.UserinDB | None:
+    user = await crud_async.get_user_by_username(conn, username=username)
     return schemas.UserinDB(**user) if user else None
 
-def authenticate_user(conn, username: str, password: str)-> schemas.UserinDB | bool:
-    user = get_user(username, conn)
+async def authenticate_user(conn, username: str, password: str)-> schemas.UserinDB | bool:
+    user = await get_user(username, conn)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -45,26 +99,75 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db = Depends(database.get_db)
-) -> schemas.UserinDB:
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str) -> schemas.TokenData:
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(digest)
+    if claims is not None:
+        # The cache TTL is only an upper bound; the token's own exp still applies.
+        if claims.expires_at > datetime.now(timezone.utc).timestamp():
+            return claims
+        token_cache.pop(digest)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise credentials_exception()
     except (jwt.InvalidTokenError, jwt.ExpiredSignatureError, Exception):
-        raise credentials_exception
+        raise credentials_exception()
+    claims = schemas.TokenData(username=username, user_id=payload.get("uid"), expires_at=payload["exp"])
+    token_cache.set(digest, claims, ttl=claims.expires_at - datetime.now(timezone.utc).timestamp())
+    return claims
 
-    user = crud.get_user_by_username(db, username=username)
+async def load_user(claims: schemas.TokenData, conn) -> schemas.UserinDB:
+    user = user_cache.get(claims.username)
+    if user is not None:
+        return user
+
+    user = await crud_async.get_user_by_username(conn, username=claims.username)
     
-    if user is None:
-        raise credentials_exception
-        
-    return schemas.UserinDB(**user)
\ No newline at end of file
+    if user is None or user["disabled"]:
+        raise credentials_exception()
+
+    user = schemas.UserinDB(**user)
+    # Never keep the user around past the lifetime of the token that loaded it.
+    user_cache.set(claims.username, user, ttl=claims.expires_at - datetime.now(timezone.utc).timestamp())
+    return user
+
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db = Depends(database.get_connection)
+) -> schemas.UserinDB:
+    claims = decode_token(token)
+    if claims.user_id is not None and claims.user_id in revoked_users:
+        raise credentials_exception()
+    return await load_user(claims, db)
+
+async def get_current_principal(
+    token: Annotated[str, Depends(oauth2_scheme)]
+) -> schemas.TokenData:
+    """Authorizes from the token claims alone; the users table is only read for tokens without a uid."""
+    claims = decode_token(token)
+    if claims.user_id is None:
+        # Borrowed only for this lookup, so routes that need no database (e.g. coalesced saves) hold no connection.
+        async with database.borrow_connection() as db:
+            user = await load_user(claims, db)
+        claims = claims.model_copy(update={"user_id": user.id})
+    if claims.user_id in revoked_users:
+        raise credentials_exception()
+    return claims
+
+def invalidate_user(user: schemas.UserinDB):
+    user_cache.pop(user.username)
+    revoked_users.add(user.id)
+
+async def disable_user(conn, user: schemas.UserinDB) -> bool:
+    disabled = await crud_async.set_user_disabled(conn, user.id, True)
+    invalidate_user(user)
+    return disabled
\ No newline at end of file
@@ -0,0 +1,76 @@
+import csv
+import hashlib
+import io
+import json
+import os
+
+SEED_PACK_DIR = os.getenv("SEED_PACK_DIR", os.path.join(os.path.dirname(__file__), "..", "seed_packs"))
+SEED_PACK_EXTENSIONS = (".json", ".csv")
+
+def parse_json_entry(entry) -> tuple[str, float]:
+    # A plain string has weight 1; weighted entries are {"content": ..., "weight": ...}.
+    if isinstance(entry, str):
+        return entry, 1.0
+    return entry["content"], float(entry.get("weight", 1))
+
+def parse_seed_pack(raw: bytes, extension: str) -> list[tuple[str, str, float]]:
+    """Parses a pack as either {"category": [content, ...]} JSON or category,content[,weight] CSV."""
+    if extension == ".json":
+        data = json.loads(raw)
+        return [(category, *parse_json_entry(entry)) for category, entries in data.items() for entry in entries]
+    reader = csv.DictReader(io.StringIO(raw.decode("utf-8")))
+    return [(row["category"], row["content"], float(row.get("weight") or 1)) for row in reader]
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+def pack_is_current(conn, name: str, digest: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT content_hash FROM seed_packs WHERE name = %s;", (name,))
+        row = cur.fetchone()
+        return row is not None and row[0] == digest
+
+def load_seed_pack(conn, name: str, rows: list[tuple[str, str, float]], digest: str):
+    """Merges a pack into random_seeds through a staging table and records its hash."""
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TEMP TABLE seed_staging (
+            category VARCHAR(50) NOT NULL,
+            content TEXT NOT NULL,
+            weight REAL NOT NULL
+        ) ON COMMIT DROP;
+        """)
+        with cur.copy("COPY seed_staging (category, content, weight) FROM STDIN;") as copy:
+            for row in rows:
+                copy.write_row(row)
+        # A pack that lists an existing entry again sets its weight.
+        cur.execute("""
+        INSERT INTO random_seeds (category, content, weight)
+        SELECT DISTINCT ON (category, content) category, content, weight FROM seed_staging
+        ORDER BY category, content, weight DESC
+        ON CONFLICT (category, content) DO UPDATE SET weight = EXCLUDED.weight
+        WHERE random_seeds.weight IS DISTINCT FROM EXCLUDED.weight;
+        """)
+        cur.execute("""
+        INSERT INTO seed_packs (name, content_hash) VALUES (%s, %s)
+        ON CONFLICT (name) DO UPDATE SET content_hash = EXCLUDED.content_hash, loaded_at = NOW();
+        """, (name, digest))
+    conn.commit()
+
+def load_seed_pack_dir(conn, directory: str = SEED_PACK_DIR) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    loaded = []
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension not in SEED_PACK_EXTENSIONS:
+            continue
+        with open(os.path.join(directory, filename), "rb") as f:
+            raw = f.read()
+        digest = content_hash(raw)
+        # Unchanged packs are skipped before they are even parsed.
+        if pack_is_current(conn, name, digest):
+            continue
+        load_seed_pack(conn, name, parse_seed_pack(raw, extension), digest)
+        loaded.append(name)
+    return loaded
\ No newline at end of file
@@ -0,0 +1,28 @@
+from typing import Iterable
+
+import orjson
+from fastapi import Response
+from pydantic import TypeAdapter
+
+import app.schemas as schemas
+
+# Rows read back from our own tables already match these schemas, so they are
+# written straight to JSON instead of being re-validated through response_model.
+CHARACTER_FIELDS = tuple(schemas.CharacterCreate.model_fields)
+CHARACTER_IN_DB_FIELDS = tuple(schemas.CharacterinDB.model_fields)
+CHARACTER_SEARCH_FIELDS = tuple(schemas.CharacterSearchResult.model_fields)
+CHARACTER_LIST_ADAPTER = TypeAdapter(list[schemas.CharacterCreate])
+
+class RawJSONResponse(Response):
+    """Response whose content is already-encoded JSON bytes."""
+    media_type = "application/json"
+
+def dump_row(row: dict, fields: tuple[str, ...] = CHARACTER_IN_DB_FIELDS) -> bytes:
+    return orjson.dumps({field: row[field] for field in fields})
+
+def dump_rows(rows: Iterable[dict], fields: tuple[str, ...] = CHARACTER_FIELDS) -> bytes:
+    return orjson.dumps([{field: row[field] for field in fields} for row in rows])
+
+def dump_models(characters: list[schemas.CharacterCreate]) -> bytes:
+    # Serialization only; pydantic-core skips validation on the way out.
+    return CHARACTER_LIST_ADAPTER.dump_json(characters)
\ No newline at end of file
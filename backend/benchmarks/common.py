@@ -0,0 +1,73 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Callable
+
+def summarize(samples: list[float]) -> dict:
+    """Turns per-call durations (seconds) into throughput and latency percentiles (ms)."""
+    ordered = sorted(samples)
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+    total = sum(ordered)
+    return {
+        "calls": len(ordered),
+        "ops_per_sec": len(ordered) / total if total else float("inf"),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+def measure(fn: Callable, iterations: int, warmup: int = 100) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def build_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--baseline", help="JSON file with previous results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.20,
+                        help="allowed p95 slowdown relative to the baseline (default 0.20 = 20%%)")
+    return parser
+
+def parse_args(parser: argparse.ArgumentParser) -> argparse.Namespace:
+    args = parser.parse_args()
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline FILE to write to")
+    return args
+
+def report(results: dict[str, dict], args) -> int:
+    print(f"{'benchmark':<36} {'ops/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<36} {stats['ops_per_sec']:>12.1f} {stats['p50_ms']:>10.4f} {stats['p95_ms']:>10.4f} {stats['p99_ms']:>10.4f}")
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if previous and stats["p95_ms"] > previous["p95_ms"] * (1 + args.tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.4f} ms -> {stats['p95_ms']:.4f} ms")
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""HTTP load scenario: login -> generate -> save -> list -> patch -> delete.
+
+    python -m benchmarks.load --url http://localhost:8000 --concurrency 32 --iterations 50 \\
+        --baseline benchmarks/load_baseline.json
+
+Exits non-zero when any step's p95 regresses past --tolerance against the baseline.
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import build_parser, parse_args, positive_int, report, summarize
+
+STEPS = ("login", "generate", "save", "list", "patch", "delete")
+
+async def timed(samples: dict[str, list[float]], step: str, request):
+    start = time.perf_counter()
+    response = await request
+    samples[step].append(time.perf_counter() - start)
+    response.raise_for_status()
+    return response
+
+async def virtual_user(client: httpx.AsyncClient, iterations: int, samples: dict[str, list[float]]):
+    username, password = f"load_{uuid.uuid4().hex[:12]}", "load-password"
+    (await client.post("/user/register", json={"username": username, "password": password})).raise_for_status()
+    for i in range(iterations):
+        start = time.perf_counter()
+        token = (await timed(samples, "login", client.post(
+            "/auth/token", data={"username": username, "password": password}
+        ))).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        character = (await timed(samples, "generate", client.post(
+            "/character/generate", json={"race": "human", "gender": "female"}, headers=headers
+        ))).json()
+        saved = (await timed(samples, "save", client.post("/character/", json=character, headers=headers))).json()
+        await timed(samples, "list", client.get("/character/", headers=headers))
+        await timed(samples, "patch", client.patch(
+            f"/character/{saved['id']}", json={"name": f"Renamed {i}"}, headers=headers
+        ))
+        await timed(samples, "delete", client.delete(f"/character/{saved['id']}", headers=headers))
+        samples["scenario"].append(time.perf_counter() - start)
+    token = (await client.post("/auth/token", data={"username": username, "password": password})).json()["access_token"]
+    await client.delete("/user/me", headers={"Authorization": f"Bearer {token}"})
+
+async def run(url: str, concurrency: int, iterations: int) -> dict[str, dict]:
+    samples = {step: [] for step in (*STEPS, "scenario")}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(virtual_user(client, iterations, samples) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    results = {step: summarize(durations) for step, durations in samples.items()}
+    # Wall-clock throughput across all virtual users, rather than per-call inverse latency.
+    results["scenario"]["ops_per_sec"] = len(samples["scenario"]) / elapsed
+    return results
+
+def main() -> int:
+    parser = build_parser(__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=positive_int, default=16)
+    parser.add_argument("--iterations", type=positive_int, default=20, help="scenarios per virtual user")
+    args = parse_args(parser)
+    return report(asyncio.run(run(args.url, args.concurrency, args.iterations)), args)
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
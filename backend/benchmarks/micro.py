@@ -0,0 +1,71 @@
+"""Micro-benchmarks for the generator and schemas; needs no database.
+
+    python -m benchmarks.micro [--baseline benchmarks/micro_baseline.json]
+"""
+import random
+import sys
+
+import numpy as np
+
+import app.schemas as schemas
+from benchmarks.common import build_parser, measure, parse_args, positive_int, report
+from service.backstory_engine import BackstoryEngine
+from service.character_generator import generate_character, generate_characters
+from service.sampling import roll_stats, roll_stats_batch
+from service.seed_catalog import SeedCatalog
+
+def build_catalog(entries: int = 100) -> SeedCatalog:
+    # Synthetic catalog shaped like the real one; importing db_init would open the DB pool.
+    # Names get rarity weights so the alias-table path is measured; fragments stay uniform.
+    rows = []
+    for race in schemas.Character_Race:
+        for kind in ("male", "female", "surname"):
+            rows += [(f"{race.value}_{kind}", f"{race.value.title()}{kind.title()}{i}", 1 + i % 5) for i in range(entries)]
+    rows += [("backstory_start_fragment", f"{{name}} grew up in town number {i}", 1) for i in range(entries)]
+    rows += [("backstory_middle_fragment", f"{{pronoun}} worked odd job number {i}", 1) for i in range(entries)]
+    rows += [("backstory_end_fragment", f"until {{pronoun}} lost {{possessive}} map number {i}.", 1) for i in range(entries)]
+    catalog = SeedCatalog()
+    catalog.load(rows)
+    return catalog
+
+def main() -> int:
+    parser = build_parser(__doc__)
+    parser.add_argument("--iterations", type=positive_int, default=20000)
+    args = parse_args(parser)
+    n = args.iterations
+
+    catalog = build_catalog()
+    rng = random.Random(1)
+    request = schemas.CharacterGenerateRequest(race="elf", gender="female")
+    batch_request = schemas.CharacterBatchGenerateRequest(race="elf", gender="female", count=1000)
+    engine = BackstoryEngine(catalog)
+    character = generate_character(request, catalog, 1)
+    payload = character.model_dump()
+
+    results = {
+        "catalog.choice[weighted]": measure(lambda: catalog.choice("elf_female", rng), n),
+        "catalog.choice[uniform]": measure(lambda: catalog.choice("backstory_start_fragment", rng), n),
+        **{
+            f"roll_stats[{method.value}]": measure(lambda method=method: roll_stats(method, rng), n)
+            for method in schemas.Stat_Method
+        },
+        "roll_stats_batch[4d6_drop_lowest,1000]": measure(
+            lambda: roll_stats_batch(schemas.Stat_Method.FOUR_D6_DROP_LOWEST, 1000, np.random.default_rng(1)), max(n // 10, 1)
+        ),
+        "BackstoryEngine.render_random": measure(
+            lambda: engine.render_random("Dara Liadon", schemas.Character_Gender.FEMALE, rng), n
+        ),
+        "BackstoryEngine.render_many[1000]": measure(
+            lambda: engine.render_many(["Dara Liadon"] * 1000, schemas.Character_Gender.FEMALE,
+                                       engine.sample_choices(1000, np.random.default_rng(1))),
+            max(n // 100, 1),
+        ),
+        "generate_character": measure(lambda: generate_character(request, catalog, rng.getrandbits(32)), n),
+        "generate_characters[1000]": measure(lambda: generate_characters(batch_request, catalog), 50, warmup=5),
+        "CharacterCreate(**payload)": measure(lambda: schemas.CharacterCreate(**payload), n),
+        "CharacterCreate.model_dump_json": measure(character.model_dump_json, n),
+    }
+    return report(results, args)
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,32 @@
+# Production run mode: gunicorn -c gunicorn.conf.py app.main:app
+import os
+import shutil
+
+# Workers inherit this from the master, so it is set before any of them imports prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Each worker's name registry only sees its own saves, so unique names are confirmed against the database.
+if workers > 1:
+    os.environ.setdefault("UNIQUE_NAMES_CONFIRM", "true")
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# When set, workers restart after this many requests so slow leaks cannot build up; jitter staggers the restarts.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+# Each worker imports the app itself, so pools and executors are created after the fork.
+preload_app = False
+accesslog = "-"
+
+def on_starting(server):
+    # Counters from a previous run would otherwise be summed into this one.
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,106 @@
+import random
+import string
+from typing import Sequence
+
+import numpy as np
+
+import app.schemas as schemas
+from service.seed_catalog import SeedCatalog
+
+# Every grammatical form a fragment may use. "pronoun" is the original name for the subject form.
+PRONOUN_FORMS = {
+    schemas.Character_Gender.MALE: {
+        "pronoun": "he", "subject": "he", "object": "him",
+        "possessive": "his", "possessive_pronoun": "his", "reflexive": "himself",
+    },
+    schemas.Character_Gender.FEMALE: {
+        "pronoun": "she", "subject": "she", "object": "her",
+        "possessive": "her", "possessive_pronoun": "hers", "reflexive": "herself",
+    },
+    schemas.Character_Gender.NONBINARY: {
+        "pronoun": "they", "subject": "they", "object": "them",
+        "possessive": "their", "possessive_pronoun": "theirs", "reflexive": "themselves",
+    },
+}
+
+# (category, text placed before the section, capitalize the section's first letter)
+DEFAULT_STRUCTURE = (
+    ("backstory_start_fragment", "", False),
+    ("backstory_middle_fragment", ". ", True),
+    ("backstory_end_fragment", " ", False),
+)
+
+_formatter = string.Formatter()
+
+def compile_fragment(fragment: str, forms: dict[str, str], prefix: str = "", capitalize: bool = False) -> tuple[str, ...]:
+    """Resolves every slot except {name} up front.
+
+    The result is the literal text between {name} slots, so rendering is a single
+    ``name.join(pieces)``.
+    """
+    pieces = [""]
+    for literal, field, _, _ in _formatter.parse(fragment):
+        pieces[-1] += literal
+        if field is None:
+            continue
+        if field == "name":
+            pieces.append("")
+        elif field in forms:
+            pieces[-1] += forms[field]
+        else:
+            # Unknown slots are left as written rather than failing the whole catalog.
+            pieces[-1] += "{" + field + "}"
+    if capitalize and pieces[0]:
+        pieces[0] = pieces[0][0].upper() + pieces[0][1:]
+    pieces[0] = prefix + pieces[0]
+    return tuple(pieces)
+
+class BackstoryEngine:
+    """Backstory fragments from one catalog version, compiled once per gender."""
+
+    def __init__(self, catalog: SeedCatalog, structure=DEFAULT_STRUCTURE):
+        self.version = catalog.version
+        self.structure = structure
+        # Sections whose category is empty are skipped entirely.
+        self.sections = [
+            (category, catalog.get(category)) for category, _, _ in structure if catalog.get(category)
+        ]
+        # Fragment rarity weights, drawn through the catalog's alias tables.
+        self.tables = [catalog.alias_table(category) for category, _ in self.sections]
+        prefixes = {category: (prefix, capitalize) for category, prefix, capitalize in structure}
+        self.compiled = {
+            gender: [
+                [compile_fragment(fragment, forms, *prefixes[category]) for fragment in fragments]
+                for category, fragments in self.sections
+            ]
+            for gender, forms in PRONOUN_FORMS.items()
+        }
+
+    def sample_choices(self, count: int, rng: np.random.Generator) -> list[np.ndarray]:
+        """Weighted fragment indices for render_many, one array per section."""
+        return [table.sample_many(count, rng) for table in self.tables]
+
+    def render(self, name: str, gender: schemas.Character_Gender, choices: Sequence[int]) -> str:
+        sections = self.compiled[gender]
+        return "".join(name.join(sections[i][choice]) for i, choice in enumerate(choices))
+
+    def render_random(self, name: str, gender: schemas.Character_Gender, rng: random.Random | None = None) -> str:
+        rng = rng or random
+        return "".join(
+            name.join(section[table.sample(rng)]) for section, table in zip(self.compiled[gender], self.tables)
+        )
+
+    def render_many(self, names: Sequence[str], gender: schemas.Character_Gender, choices: Sequence[Sequence[int]]) -> list[str]:
+        """Renders one backstory per name; choices[k][i] picks section k's fragment for row i."""
+        sections = self.compiled[gender]
+        picked = [[section[j] for j in section_choices] for section, section_choices in zip(sections, choices)]
+        return ["".join(name.join(pieces) for pieces in row) for name, row in zip(names, zip(*picked))]
+
+_engine: BackstoryEngine | None = None
+
+def get_engine(catalog: SeedCatalog) -> BackstoryEngine:
+    global _engine
+    engine = _engine
+    if engine is None or engine.version != catalog.version:
+        engine = _engine = BackstoryEngine(catalog)
+    return engine
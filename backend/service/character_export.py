@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Iterator
+
+import app.crud as crud
+import app.crud_async as crud_async
+import app.database as database
+import app.schemas as schemas
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+MEDIA_TYPES = {
+    schemas.ExportFormat.NDJSON: "application/x-ndjson",
+    schemas.ExportFormat.CSV: "text/csv",
+}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def encode_ndjson(rows: list[tuple]) -> str:
+    return "".join(
+        json.dumps(dict(zip(crud.EXPORT_COLUMNS, row)), default=_json_default) + "\n"
+        for row in rows
+    )
+
+def encode_csv(rows: list[tuple], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(crud.EXPORT_COLUMNS)
+    writer.writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+def export_characters(user_id: int, export_format: schemas.ExportFormat) -> Iterator[str]:
+    # The export outlives the request's dependencies, so it holds its own connection.
+    with database.get_db_context() as conn:
+        if export_format == schemas.ExportFormat.CSV:
+            yield encode_csv([], header=True)
+        for rows in crud.iter_user_character_batches(conn, user_id, EXPORT_BATCH_SIZE):
+            yield encode_csv(rows) if export_format == schemas.ExportFormat.CSV else encode_ndjson(rows)
+
+async def export_characters_async(user_id: int, export_format: schemas.ExportFormat) -> AsyncIterator[str]:
+    async with database.get_async_db_context() as conn:
+        if export_format == schemas.ExportFormat.CSV:
+            yield encode_csv([], header=True)
+        async for rows in crud_async.iter_user_character_batches(conn, user_id, EXPORT_BATCH_SIZE):
+            yield encode_csv(rows) if export_format == schemas.ExportFormat.CSV else encode_ndjson(rows)
\ No newline at end of file
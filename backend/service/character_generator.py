@@ -1,55 +1,137 @@
 import random
+from typing import Container
+import numpy as np
 import app.schemas as schemas
-import app.crud as crud
-import app.database as database
+import app.metrics as metrics
+from service.seed_catalog import SeedCatalog
+import service.backstory_engine as backstory_engine
+import service.sampling as sampling
 
-def generate_character(request: schemas.CharacterGenerateRequest, conn) -> schemas.CharacterCreate:
+MAX_GENERATION_SEED = 2**63
+# Random draws tried for a unique name before falling back to enumerating what is left.
+UNIQUE_NAME_ATTEMPTS = 32
+
+class NameSpaceExhausted(Exception):
+    """Every first/last name combination for a race and gender is already taken."""
+
+def new_generation_seed() -> int:
+    return random.randrange(MAX_GENERATION_SEED)
+
+def generate_character(request: schemas.CharacterGenerateRequest, catalog: SeedCatalog, seed: int | None = None, taken: Container[str] = ()) -> schemas.CharacterCreate:
+    """Generates a character; the result is fully determined by (seed, request, catalog.version) and, with unique, taken."""
+    # Every draw below goes through this one generator, in a fixed order.
+    rng = random.Random(new_generation_seed() if seed is None else seed)
     race = request.race
     gender = request.gender
-    name = generate_character_name(race, gender, conn)
-    backstory = generate_backstory(name, gender, conn)
-    stats = {
-        "stat_str": roll_4d6_drop_lowest(),
-        "stat_dex": roll_4d6_drop_lowest(),
-        "stat_con": roll_4d6_drop_lowest(),
-        "stat_int": roll_4d6_drop_lowest(),
-        "stat_wis": roll_4d6_drop_lowest(),
-        "stat_cha": roll_4d6_drop_lowest(),
-    }
-    character = schemas.CharacterCreate(
-        name=name,
-        race=race,
-        gender=gender,
-        backstory=backstory,
-        **stats
-    )
+    with metrics.stage("name"):
+        if request.unique:
+            name = generate_unique_character_name(race, gender, catalog, taken, rng)
+        else:
+            name = generate_character_name(race, gender, catalog, rng)
+    with metrics.stage("backstory"):
+        backstory = generate_backstory(name, gender, catalog, rng)
+    with metrics.stage("stats"):
+        stats = sampling.roll_stats(request.stat_method, rng)
+    with metrics.stage("validation"):
+        character = schemas.CharacterCreate(
+            name=name,
+            race=race,
+            gender=gender,
+            backstory=backstory,
+            **stats
+        )
     return character
 
-def generate_character_name(race: schemas.Character_Race, gender: schemas.Character_Gender, conn) -> str:
+def generate_character_name(race: schemas.Character_Race, gender: schemas.Character_Gender, catalog: SeedCatalog, rng: random.Random | None = None) -> str:
+    rng = rng or random
     if gender.value == "nonbinary":
-        name_gender = random.choice(["male", "female"])
+        name_gender = rng.choice(["male", "female"])
     else:
         name_gender = gender.value
-    first_name = crud.get_random_seed(conn, f"{race.value}_{name_gender}")
-    last_name = crud.get_random_seed(conn, f"{race.value}_surname")
+    first_name = catalog.choice(f"{race.value}_{name_gender}", rng)
+    last_name = catalog.choice(f"{race.value}_surname", rng)
     full_name = f"{first_name} {last_name}"
     return full_name
 
-def generate_backstory(name: str, gender: schemas.Character_Gender, conn) -> str:
-    origin = crud.get_random_seed(conn, "backstory_start_fragment")
-    middle = crud.get_random_seed(conn, "backstory_middle_fragment")
-    conclusion = crud.get_random_seed(conn, "backstory_end_fragment")
-    name_mapping = {
-        "name": name,
-        "pronoun": "he" if gender == schemas.Character_Gender.MALE else "she" if gender == schemas.Character_Gender.FEMALE else "they",
-        "possessive": "his" if gender == schemas.Character_Gender.MALE else "her" if gender == schemas.Character_Gender.FEMALE else "their"     
-    }
-    origin = origin.format(**name_mapping)
-    middle = middle.format(**name_mapping).capitalize()
-    conclusion = conclusion.format(**name_mapping)
-    return f"{origin}. {middle} {conclusion}"
-
-def roll_4d6_drop_lowest() -> int:
-    rolls = [random.randint(1, 6) for _ in range(4)]
-    rolls.remove(min(rolls))
-    return sum(rolls)
\ No newline at end of file
+def name_space(race: schemas.Character_Race, gender: schemas.Character_Gender, catalog: SeedCatalog) -> list[str]:
+    genders = ["male", "female"] if gender == schemas.Character_Gender.NONBINARY else [gender.value]
+    first_names = dict.fromkeys(name for name_gender in genders for name in catalog.get(f"{race.value}_{name_gender}"))
+    last_names = dict.fromkeys(catalog.get(f"{race.value}_surname"))
+    return [f"{first} {last}" for first in first_names for last in last_names]
+
+def generate_unique_character_name(race: schemas.Character_Race, gender: schemas.Character_Gender, catalog: SeedCatalog, taken: Container[str], rng: random.Random | None = None) -> str:
+    rng = rng or random
+    for _ in range(UNIQUE_NAME_ATTEMPTS):
+        name = generate_character_name(race, gender, catalog, rng)
+        if name not in taken:
+            return name
+    # Random draws keep landing on owned names, so most of the space is used: choose among what is left.
+    remaining = [name for name in name_space(race, gender, catalog) if name not in taken]
+    if not remaining:
+        raise NameSpaceExhausted(f"No unused {gender.value} {race.value} names are left")
+    return rng.choice(remaining)
+
+def generate_backstory(name: str, gender: schemas.Character_Gender, catalog: SeedCatalog, rng: random.Random | None = None) -> str:
+    return backstory_engine.get_engine(catalog).render_random(name, gender, rng)
+
+def generate_characters(request: schemas.CharacterBatchGenerateRequest, catalog: SeedCatalog, taken: Container[str] = ()) -> list[schemas.CharacterCreate]:
+    race = request.race
+    gender = request.gender
+    count = request.count
+    rng = np.random.default_rng()
+
+    with metrics.stage("batch_seeds"):
+        if gender == schemas.Character_Gender.NONBINARY:
+            male_names = catalog.sample(f"{race.value}_male", count, rng)
+            female_names = catalog.sample(f"{race.value}_female", count, rng)
+            use_male = rng.integers(0, 2, size=count)
+            first_names = [male if pick else female for male, female, pick in zip(male_names, female_names, use_male)]
+        else:
+            first_names = catalog.sample(f"{race.value}_{gender.value}", count, rng)
+        last_names = catalog.sample(f"{race.value}_surname", count, rng)
+        engine = backstory_engine.get_engine(catalog)
+        fragment_choices = [choices.tolist() for choices in engine.sample_choices(count, rng)]
+    with metrics.stage("batch_stats"):
+        stats = sampling.roll_stats_batch(request.stat_method, count, rng).tolist()
+
+    names = [f"{first} {last}" for first, last in zip(first_names, last_names)]
+    if request.unique:
+        with metrics.stage("batch_unique_names"):
+            names = make_names_unique(names, race, gender, catalog, taken, rng)
+    with metrics.stage("batch_backstory"):
+        backstories = engine.render_many(names, gender, fragment_choices)
+
+    characters = []
+    with metrics.stage("batch_assemble"):
+        for i in range(count):
+            name = names[i]
+            # Every field is produced here from known-good values, so skip re-validation.
+            characters.append(schemas.CharacterCreate.model_construct(
+                name=name,
+                race=race,
+                gender=gender,
+                backstory=backstories[i],
+                **dict(zip(schemas.STAT_FIELDS, stats[i]))
+            ))
+    return characters
+
+def make_names_unique(names: list[str], race: schemas.Character_Race, gender: schemas.Character_Gender, catalog: SeedCatalog, taken: Container[str], rng: np.random.Generator) -> list[str]:
+    """Redraws names that are owned already or repeated within the batch."""
+    used: set[str] = set()
+    redraw_rng = random.Random(int(rng.integers(MAX_GENERATION_SEED)))
+    unique = []
+    for name in names:
+        if name in taken or name in used:
+            name = generate_unique_character_name(race, gender, catalog, BlockedNames(taken, used), redraw_rng)
+        used.add(name)
+        unique.append(name)
+    return unique
+
+class BlockedNames:
+    """Membership in either of two containers, without copying them."""
+
+    def __init__(self, *containers: Container[str]):
+        self.containers = containers
+
+    def __contains__(self, name) -> bool:
+        return any(name in container for container in self.containers)
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+import itertools
+import os
+from collections import deque
+
+from starlette.concurrency import run_in_threadpool
+
+import app.database as database
+import app.metrics as metrics
+import app.schemas as schemas
+import service.seed_catalog as seed_catalog
+from service.character_generator import generate_character, new_generation_seed
+
+RESERVOIR_ENABLED = os.getenv("RESERVOIR_ENABLED", "false").lower() == "true"
+RESERVOIR_LOW_WATERMARK = int(os.getenv("RESERVOIR_LOW_WATERMARK", "50"))
+RESERVOIR_HIGH_WATERMARK = int(os.getenv("RESERVOIR_HIGH_WATERMARK", "200"))
+RESERVOIR_REFILL_CHUNK = int(os.getenv("RESERVOIR_REFILL_CHUNK", "50"))
+
+ReservoirEntry = tuple[int, str, schemas.CharacterCreate]
+
+class CharacterReservoir:
+    """Per-(race, gender) queues of ready characters, topped up by a background task."""
+
+    def __init__(self, low_watermark: int = RESERVOIR_LOW_WATERMARK, high_watermark: int = RESERVOIR_HIGH_WATERMARK):
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.queues: dict[tuple[schemas.Character_Race, schemas.Character_Gender], deque[ReservoirEntry]] = {
+            key: deque() for key in itertools.product(schemas.Character_Race, schemas.Character_Gender)
+        }
+        self.catalog_version: str | None = None
+        self._wake = asyncio.Event()
+
+    def pop(self, race: schemas.Character_Race, gender: schemas.Character_Gender) -> ReservoirEntry | None:
+        queue = self.queues[(race, gender)]
+        # A stale catalog is a miss: the request path reloads it, and the next pop sees whether its version moved.
+        entry = queue.popleft() if queue and not seed_catalog.catalog.is_stale() else None
+        if entry is not None and entry[1] != seed_catalog.catalog.version:
+            # The catalog was reloaded since this was rolled, so its seed would no longer reproduce it.
+            # Every queue is equally outdated; drop them all and let refill start over.
+            for stale in self.queues.values():
+                stale.clear()
+            entry = None
+        metrics.RESERVOIR_REQUESTS.labels("hit" if entry else "miss").inc()
+        metrics.RESERVOIR_DEPTH.labels(race.value, gender.value).set(len(queue))
+        if len(queue) < self.low_watermark:
+            self._wake.set()
+        return entry
+
+    async def _refresh_catalog(self) -> seed_catalog.SeedCatalog:
+        if not seed_catalog.catalog.is_stale():
+            return seed_catalog.catalog
+        # The refill task has no request, so it borrows its own connection.
+        if database.DB_ASYNC:
+            async with database.get_async_db_context() as conn:
+                return await seed_catalog.get_catalog_async(conn)
+        def refresh():
+            with database.get_db_context() as conn:
+                return seed_catalog.get_catalog(conn)
+        return await run_in_threadpool(refresh)
+
+    def _generate_chunk(self, catalog, race, gender, count: int) -> list[ReservoirEntry]:
+        request = schemas.CharacterGenerateRequest(race=race, gender=gender)
+        entries = []
+        for _ in range(count):
+            seed = new_generation_seed()
+            entries.append((seed, catalog.version, generate_character(request, catalog, seed)))
+        return entries
+
+    async def refill(self):
+        catalog = await self._refresh_catalog()
+        if catalog.version != self.catalog_version:
+            # Stored seeds only reproduce against the catalog they were generated from.
+            for queue in self.queues.values():
+                queue.clear()
+            self.catalog_version = catalog.version
+        for (race, gender), queue in self.queues.items():
+            while len(queue) < self.high_watermark:
+                count = min(RESERVOIR_REFILL_CHUNK, self.high_watermark - len(queue))
+                queue.extend(await run_in_threadpool(self._generate_chunk, catalog, race, gender, count))
+            metrics.RESERVOIR_DEPTH.labels(race.value, gender.value).set(len(queue))
+
+    async def run(self):
+        self._wake.set()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                await self.refill()
+            except Exception as e:
+                print(f"Character reservoir refill failed: {e}")
+                await asyncio.sleep(1)
+                self._wake.set()
+
+reservoir = CharacterReservoir()
\ No newline at end of file
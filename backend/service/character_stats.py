@@ -0,0 +1,24 @@
+import math
+
+import app.schemas as schemas
+
+def summarize_stat(count: int, total: int, squares: int) -> schemas.StatSummary:
+    mean = total / count if count else 0.0
+    # Population variance from the running sums; clamp the tiny negatives that rounding can produce.
+    variance = max(squares / count - mean * mean, 0.0) if count else 0.0
+    return schemas.StatSummary(sum=total, sum_squares=squares, mean=mean, stddev=math.sqrt(variance))
+
+def build_character_stats(rows: list[dict]) -> schemas.CharacterStats:
+    groups = [
+        schemas.CharacterStatsGroup(
+            race=row["race"],
+            gender=row["gender"],
+            count=row["count"],
+            stats={
+                stat: summarize_stat(row["count"], row[f"sum_{stat}"], row[f"sumsq_{stat}"])
+                for stat in schemas.STAT_FIELDS
+            },
+        )
+        for row in rows
+    ]
+    return schemas.CharacterStats(count=sum(group.count for group in groups), groups=groups)
@@ -0,0 +1,125 @@
+import asyncio
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+import app.crud as crud
+import app.crud_async as crud_async
+import app.database as database
+import app.metrics as metrics
+import app.schemas as schemas
+
+WRITE_COALESCING_ENABLED = os.getenv("WRITE_COALESCING_ENABLED", "false").lower() == "true"
+WRITE_COALESCING_MAX_BATCH = int(os.getenv("WRITE_COALESCING_MAX_BATCH", "200"))
+WRITE_COALESCING_MAX_DELAY_MS = float(os.getenv("WRITE_COALESCING_MAX_DELAY_MS", "5"))
+
+PendingSave = tuple[schemas.CharacterCreate, int, asyncio.Future]
+
+def insert_each(conn, items: list[tuple[schemas.CharacterCreate, int]]) -> list:
+    # One bad row fails the whole batch statement; redo each alone so only its own caller sees the error.
+    results = []
+    for char, user_id in items:
+        try:
+            with conn.transaction():
+                results.append(crud.create_character(conn, char, user_id))
+        except Exception as e:
+            results.append(e)
+    return results
+
+async def insert_each_async(conn, items: list[tuple[schemas.CharacterCreate, int]]) -> list:
+    results = []
+    for char, user_id in items:
+        try:
+            async with conn.transaction():
+                results.append(await crud_async.create_character(conn, char, user_id))
+        except Exception as e:
+            results.append(e)
+    return results
+
+class CharacterWriteQueue:
+    """Group commit for character saves.
+
+    Saves arriving within max_delay of each other (up to max_batch of them) are
+    inserted with one statement and one commit on the queue's own connection.
+    Every caller still receives its own row, or its own exception.
+    """
+
+    def __init__(self, max_batch: int = WRITE_COALESCING_MAX_BATCH, max_delay_ms: float = WRITE_COALESCING_MAX_DELAY_MS):
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.pending: list[PendingSave] = []
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closed = False
+
+    async def submit(self, char: schemas.CharacterCreate, user_id: int) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((char, user_id, future))
+        self._wake.set()
+        if len(self.pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def _flush_sync(self, items: list[tuple[schemas.CharacterCreate, int]]) -> list:
+        with database.get_db_context() as conn:
+            try:
+                return crud.create_characters(conn, items)
+            except Exception:
+                conn.rollback()
+                return insert_each(conn, items)
+
+    async def _flush_async(self, items: list[tuple[schemas.CharacterCreate, int]]) -> list:
+        async with database.get_async_db_context() as conn:
+            try:
+                return await crud_async.create_characters(conn, items)
+            except Exception:
+                await conn.rollback()
+                return await insert_each_async(conn, items)
+
+    async def flush(self, batch: list[PendingSave]):
+        items = [(char, user_id) for char, user_id, _ in batch]
+        metrics.WRITE_BATCH_SIZE.observe(len(items))
+        try:
+            # Results are handed out only after the connection context has committed.
+            if database.DB_ASYNC:
+                results = await self._flush_async(items)
+            else:
+                results = await run_in_threadpool(self._flush_sync, items)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            # The caller may have gone away (e.g. client disconnect); its row is saved regardless.
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self):
+        while self.pending:
+            batch = self.pending[:self.max_batch]
+            del self.pending[:self.max_batch]
+            await self.flush(batch)
+
+    def close(self):
+        """Stops run() once its current flush has finished; drain() afterwards writes anything still pending."""
+        self._closed = True
+        self._wake.set()
+        self._full.set()
+
+    async def run(self):
+        while not self._closed:
+            await self._wake.wait()
+            # Let concurrent saves join this batch, unless it is already full.
+            if len(self.pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            self._full.clear()
+            # Saves that arrive during a flush go out in the next batch right away.
+            await self.drain()
+
+character_write_queue = CharacterWriteQueue()
@@ -0,0 +1,49 @@
+import os
+from collections import Counter
+
+import app.crud_async as crud_async
+from app.cache import TTLCache
+
+NAME_REGISTRY_SIZE = int(os.getenv("NAME_REGISTRY_SIZE", "10000"))
+NAME_REGISTRY_TTL = int(os.getenv("NAME_REGISTRY_TTL_SECONDS", "300"))
+# With several workers, another process may have saved a name this registry has not seen yet. When
+# enabled, unique generation confirms its chosen names with one exact query (gunicorn.conf.py turns
+# it on for multi-worker runs).
+UNIQUE_NAMES_CONFIRM = os.getenv("UNIQUE_NAMES_CONFIRM", "false").lower() == "true"
+
+class NameRegistry:
+    """Per-user multiset of owned character names, so unique generation needs no query per attempt.
+
+    Loaded lazily from the database and kept current by this process's own writes. Writes made
+    by other workers show up once the entry expires, or when an exhaustion check reloads it.
+    """
+
+    def __init__(self, maxsize: int = NAME_REGISTRY_SIZE, ttl: int = NAME_REGISTRY_TTL):
+        self.users = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def cached(self, user_id: int) -> Counter | None:
+        return self.users.get(user_id)
+
+    async def reload(self, conn, user_id: int) -> Counter:
+        names = Counter(await crud_async.get_user_character_names(conn, user_id))
+        self.users.set(user_id, names)
+        return names
+
+    def add(self, user_id: int, *names: str):
+        # Users that were never loaded are left alone; their first load reads the table anyway.
+        owned = self.users.get(user_id)
+        if owned is not None:
+            owned.update(names)
+
+    def discard(self, user_id: int, name: str):
+        # Counted, because a user may own several characters with the same name.
+        owned = self.users.get(user_id)
+        if owned is not None and owned[name] > 0:
+            owned[name] -= 1
+            if owned[name] == 0:
+                del owned[name]
+
+    def invalidate(self, user_id: int):
+        self.users.pop(user_id)
+
+name_registry = NameRegistry()
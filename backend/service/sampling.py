@@ -0,0 +1,100 @@
+import itertools
+import random
+from typing import Sequence
+
+import numpy as np
+
+import app.schemas as schemas
+
+class AliasTable:
+    """Walker/Vose alias table: O(1) weighted draws after an O(n) build."""
+
+    def __init__(self, weights: Sequence[float]):
+        self.size = len(weights)
+        # Equal weights skip the table entirely and keep the exact draw sequence of rng.choice.
+        self.uniform = len(set(weights)) <= 1
+        if self.uniform:
+            return
+        total = float(sum(weights))
+        scaled = [w * self.size / total for w in weights]
+        prob = [1.0] * self.size
+        alias = list(range(self.size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left over is 1.0 up to rounding error, so it keeps prob 1 and never aliases.
+        self.prob = prob
+        self.alias = alias
+        self._np_prob = np.array(prob)
+        self._np_alias = np.array(alias)
+
+    def sample(self, rng: random.Random | None = None) -> int:
+        rng = rng or random
+        i = rng.randrange(self.size)
+        if self.uniform or rng.random() < self.prob[i]:
+            return i
+        return self.alias[i]
+
+    def sample_many(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        i = rng.integers(0, self.size, size=count)
+        if self.uniform:
+            return i
+        return np.where(rng.random(count) < self._np_prob[i], i, self._np_alias[i])
+
+class StatTable:
+    """Every equally likely outcome of a stat method, so one draw is one table lookup.
+
+    Rows hold either a single stat (drawn independently for each of the six) or a
+    complete six-stat assignment.
+    """
+
+    def __init__(self, outcomes: Sequence[Sequence[int]]):
+        self.outcomes = np.array(outcomes, dtype=np.int64)
+        self.per_stat = self.outcomes.shape[1] == 1
+        self._rows = [tuple(row) for row in self.outcomes.tolist()]
+
+    def roll(self, rng: random.Random | None = None) -> list[int]:
+        rng = rng or random
+        n = len(self._rows)
+        if self.per_stat:
+            return [self._rows[rng.randrange(n)][0] for _ in schemas.STAT_FIELDS]
+        return list(self._rows[rng.randrange(n)])
+
+    def roll_batch(self, count: int, rng: np.random.Generator) -> np.ndarray:
+        n = len(self.outcomes)
+        if self.per_stat:
+            return self.outcomes[rng.integers(0, n, size=(count, len(schemas.STAT_FIELDS))), 0]
+        return self.outcomes[rng.integers(0, n, size=count)]
+
+def dice_outcomes(dice: int, keep: int) -> list[list[int]]:
+    # All 6**dice rolls, each appearing once, so the table is the exact distribution.
+    return [[sum(sorted(roll)[dice - keep:])] for roll in itertools.product(range(1, 7), repeat=dice)]
+
+POINT_BUY_BUDGET = 27
+POINT_BUY_COST = {8: 0, 9: 1, 10: 2, 11: 3, 12: 4, 13: 5, 14: 7, 15: 9}
+STANDARD_ARRAY = (15, 14, 13, 12, 10, 8)
+
+def point_buy_outcomes(budget: int = POINT_BUY_BUDGET) -> np.ndarray:
+    """Every assignment of scores 8..15 that spends exactly the point-buy budget."""
+    scores = np.array(sorted(POINT_BUY_COST))
+    costs = np.array([POINT_BUY_COST[s] for s in scores])
+    grid = np.indices((len(scores),) * len(schemas.STAT_FIELDS)).reshape(len(schemas.STAT_FIELDS), -1).T
+    return scores[grid[costs[grid].sum(axis=1) == budget]]
+
+STAT_TABLES = {
+    schemas.Stat_Method.FOUR_D6_DROP_LOWEST: StatTable(dice_outcomes(4, 3)),
+    schemas.Stat_Method.THREE_D6: StatTable(dice_outcomes(3, 3)),
+    schemas.Stat_Method.POINT_BUY: StatTable(point_buy_outcomes()),
+    schemas.Stat_Method.STANDARD_ARRAY: StatTable(list(itertools.permutations(STANDARD_ARRAY))),
+}
+
+def roll_stats(method: schemas.Stat_Method, rng: random.Random | None = None) -> dict[str, int]:
+    return dict(zip(schemas.STAT_FIELDS, STAT_TABLES[method].roll(rng)))
+
+def roll_stats_batch(method: schemas.Stat_Method, count: int, rng: np.random.Generator) -> np.ndarray:
+    return STAT_TABLES[method].roll_batch(count, rng)
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+import app.crud as crud
+import app.crud_async as crud_async
+from service.sampling import AliasTable
+
+SEED_CATALOG_TTL = int(os.getenv("SEED_CATALOG_TTL_SECONDS", "300"))
+
+class SeedCatalog:
+    """In-memory copy of the random_seeds table, indexed by category."""
+
+    def __init__(self, ttl: int = SEED_CATALOG_TTL):
+        self.ttl = ttl
+        # category -> (contents, alias table over their weights)
+        self._seeds: dict[str, tuple[tuple[str, ...], AliasTable]] = {}
+        self._loaded_at: float | None = None
+        self.version: str | None = None
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def load(self, rows: list[tuple[str, str, float]]):
+        seeds: dict[str, list[str]] = {}
+        weights: dict[str, list[float]] = {}
+        digest = hashlib.sha256()
+        for category, content, weight in rows:
+            seeds.setdefault(category, []).append(content)
+            weights.setdefault(category, []).append(weight)
+            digest.update(f"{category}\x00{content}\x00".encode())
+            # Default weights leave the version of an unweighted catalog unchanged.
+            if weight != 1:
+                digest.update(f"{weight!r}\x00".encode())
+        # Swap the whole mapping at once so readers never see a half-built catalog.
+        self._seeds = {
+            category: (tuple(contents), AliasTable(weights[category])) for category, contents in seeds.items()
+        }
+        # Identifies the exact seed content, so seeded generation can be reproduced.
+        self.version = digest.hexdigest()[:16]
+        self._loaded_at = time.monotonic()
+
+    def refresh(self, conn):
+        self.load(crud.get_all_seeds(conn))
+
+    def ensure_fresh(self, conn):
+        if not self.is_stale():
+            return
+        with self._lock:
+            if self.is_stale():
+                self.refresh(conn)
+
+    async def ensure_fresh_async(self, conn):
+        if not self.is_stale():
+            return
+        async with self._async_lock:
+            if self.is_stale():
+                self.load(await crud_async.get_all_seeds(conn))
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def get(self, category: str) -> tuple[str, ...]:
+        return self._seeds.get(category, ((), None))[0]
+
+    def alias_table(self, category: str) -> AliasTable | None:
+        return self._seeds.get(category, ((), None))[1]
+
+    def choice(self, category: str, rng: random.Random | None = None) -> str | None:
+        entry = self._seeds.get(category)
+        if entry is None:
+            return None
+        seeds, table = entry
+        return seeds[table.sample(rng)]
+
+    def sample(self, category: str, count: int, rng: np.random.Generator) -> list[str | None]:
+        entry = self._seeds.get(category)
+        if entry is None:
+            return [None] * count
+        seeds, table = entry
+        return [seeds[i] for i in table.sample_many(count, rng)]
+
+catalog = SeedCatalog()
+
+def get_catalog(conn) -> SeedCatalog:
+    catalog.ensure_fresh(conn)
+    return catalog
+
+async def get_catalog_async(conn) -> SeedCatalog:
+    await catalog.ensure_fresh_async(conn)
+    return catalog
+
+def invalidate():
+    catalog.invalidate()
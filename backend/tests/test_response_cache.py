@@ -0,0 +1,55 @@
+import pytest
+
+import app.cache as cache
+from app.response_cache import MemoryBackend, ResponseCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+def test_generation_is_not_reused_after_its_counter_expires(clock):
+    backend = MemoryBackend()
+    responses = ResponseCache(backend, ttl=30)
+    backend.counters.ttl = 30
+    responses.invalidate_user(1)
+    clock.now += 29
+    responses.set(responses.key(1, "list"), ("etag", b"OLD", {}))
+    # The counter has expired but the entry cached under it has not.
+    clock.now += 2
+    responses.invalidate_user(1)
+    assert responses.get(responses.key(1, "list")) is None
+
+def test_entry_read_before_a_write_is_orphaned_by_it():
+    responses = ResponseCache(MemoryBackend())
+    cache_key = responses.key(1, "list")
+    assert responses.get(cache_key) is None
+    # A write commits and invalidates while the miss is still reading the database.
+    responses.invalidate_user(1)
+    responses.set(cache_key, ("etag", b"STALE", {}))
+    assert responses.get(responses.key(1, "list")) is None
+
+def test_entry_is_served_until_the_next_write():
+    responses = ResponseCache(MemoryBackend())
+    responses.set(responses.key(1, "list"), ("etag", b"FRESH", {}))
+    assert responses.get(responses.key(1, "list")) == ("etag", b"FRESH", {})
+    assert responses.get(responses.key(2, "list")) is None
+    responses.invalidate_user(1)
+    assert responses.get(responses.key(1, "list")) is None
+
+def test_expired_counters_are_forgotten(clock):
+    backend = MemoryBackend()
+    backend.counters.ttl = 30
+    for user_id in range(100):
+        backend.incr(f"generation:{user_id}")
+    clock.now += 31
+    backend.incr("generation:100")
+    assert len(backend.counters) == 1